@@ -0,0 +1,220 @@
+from Board import *
+from Agent import SearchCancelled
+import copy
+import queue
+import threading
+
+# Kinds of request handled by the worker thread
+_SEARCH = 0
+_PONDER = 1
+_NEW_GAME = 2
+
+
+class AIWorker:
+    # Runs an agent's searches on a background thread, so that a game loop
+    # can keep handling events and drawing while the agent thinks.
+    #
+    # Every search is of a copy of the board, so the game's board can change
+    # while it runs. Moves come back through a queue which the loop checks
+    # with poll(). Cancelling a search discards its move, even if it had
+    # already finished.
+    #
+    # While the opponent is thinking the worker can ponder: search the
+    # agent's reply to each of the opponent's moves, the one the agent
+    # expects first. When the opponent moves, a reply already found is
+    # returned straight away, and one being searched is waited for rather
+    # than started again. Either way the agent's transposition table is warm.
+    #
+    # The agent should only be used through the worker while it's running.
+    # Agents with a cancel() method, like MinimaxAgent, stop searching as
+    # soon as they're cancelled, others finish their search first.
+    def __init__(self, agent):
+        self.agent = agent
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+
+        # Number of the latest request, results of any other are stale
+        self._search_id = 0
+        self._thinking = False
+        self._pondering = False
+
+        # Replies found while pondering, keyed by the position key, so moves
+        # played in a different order still find them, the position being
+        # pondered and the search waiting on it
+        self._lock = threading.Lock()
+        self._ponder_moves = dict()
+        self._ponder_key = None
+        self._waiting = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def request_move(self, board):
+        # Start searching for a move in the board's current position
+        key = board.position_key()
+        with self._lock:
+            self._search_id += 1
+            self._thinking = True
+            self._pondering = False
+            found = key in self._ponder_moves
+            if found:
+                self._results.put((self._search_id, self._ponder_moves[key]))
+
+            # Let the search of this position finish if it's being pondered
+            waiting = not found and key == self._ponder_key
+            if waiting:
+                self._waiting = self._search_id
+
+        if not waiting:
+            self._cancel_agent()
+        if not found and not waiting:
+            self._requests.put((self._search_id, _SEARCH, copy.deepcopy(board)))
+
+
+    def ponder(self, board):
+        # Search replies to the opponent's moves in the board's current position
+        self.cancel()
+        self._pondering = True
+        self._requests.put((self._search_id, _PONDER, copy.deepcopy(board)))
+
+
+    def poll(self):
+        # The move found by the latest search, or None if it's still thinking
+        while True:
+            try:
+                search_id, result = self._results.get_nowait()
+            except queue.Empty:
+                return None
+
+            if search_id == self._search_id:
+                self._thinking = False
+                if isinstance(result, Exception):
+                    raise result
+                return result
+
+
+    def is_thinking(self):
+        return self._thinking
+
+
+    def is_pondering(self):
+        return self._pondering
+
+
+    def cancel(self):
+        # Stop the current search or pondering and discard its move
+        with self._lock:
+            self._search_id += 1
+            self._waiting = None
+        busy = self._thinking or self._pondering
+        self._thinking = self._pondering = False
+        if busy:
+            self._cancel_agent()
+
+
+    def new_game(self):
+        # Forget everything learnt about the previous game
+        self.cancel()
+        with self._lock:
+            self._ponder_moves = dict()
+        self._requests.put((self._search_id, _NEW_GAME, None))
+
+
+    def close(self):
+        self.cancel()
+        self._requests.put(None)
+        self._thread.join()
+
+
+    def _cancel_agent(self):
+        if hasattr(self.agent, "cancel"):
+            self.agent.cancel()
+
+
+    def _start_request(self, search_id):
+        # Whether the request is still the latest, in which case the agent's
+        # last cancel is cleared ready to search for it. Both happen under the
+        # lock, so a cancel() before this skips the request and one after it
+        # stops the search.
+        with self._lock:
+            if search_id != self._search_id:
+                return False
+            self._clear_agent_cancel()
+            return True
+
+
+    def _clear_agent_cancel(self):
+        # Called with the lock held
+        if hasattr(self.agent, "clear_cancel"):
+            self.agent.clear_cancel()
+
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+
+            search_id, kind, board = request
+            if kind == _NEW_GAME:
+                if hasattr(self.agent, "new_game"):
+                    self.agent.new_game()
+            elif not self._start_request(search_id):
+                # Skip requests cancelled before they started
+                continue
+            elif kind == _SEARCH:
+                result = self._search(board)
+                if result is not None:
+                    self._results.put((search_id, result))
+            elif kind == _PONDER:
+                self._ponder(search_id, board)
+
+
+    def _search(self, board):
+        # The agent's move, an exception it raised, or None if cancelled
+        self.agent.board = board
+        try:
+            return self.agent.get_move()
+        except SearchCancelled:
+            return None
+        except Exception as error:
+            return error
+
+
+    def _ponder(self, search_id, board):
+        # The opponent's expected move first, then the rest from the centre outwards
+        expected = None
+        if hasattr(self.agent, "predict_move"):
+            self.agent.board = board
+            expected = self.agent.predict_move()
+        centre = board.get_width() - 1
+        replies = sorted(board.get_valid_moves(), key=lambda m: (m != expected, abs(2 * m - centre)))
+
+        for reply in replies:
+            position = copy.deepcopy(board)
+            position.play(reply)
+            key = position.position_key()
+
+            with self._lock:
+                # Stop once the opponent has moved, or pondering was cancelled
+                if search_id != self._search_id:
+                    break
+                if position.get_winner() != NO_PIECE or key in self._ponder_moves:
+                    continue
+                self._ponder_key = key
+                self._clear_agent_cancel()
+
+            result = self._search(position)
+
+            with self._lock:
+                self._ponder_key = None
+                if result is None:
+                    # Cancelled, and nobody is waiting for the move
+                    break
+                if not isinstance(result, Exception):
+                    self._ponder_moves[key] = result
+                if self._waiting is not None:
+                    self._results.put((self._waiting, result))
+                    self._waiting = None
+                    break
@@ -1,5 +1,127 @@
 from Board import *
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from collections import namedtuple
 import numpy as np
+import time
+
+# Bounds seen from the other player's point of view
+FLIP_BOUND = {EXACT: EXACT, LOWER_BOUND: UPPER_BOUND, UPPER_BOUND: LOWER_BOUND}
+
+# Outcome of a search: the move chosen, its score, the depth searched
+# and the SearchStats if they were collected
+SearchResult = namedtuple("SearchResult", ["move", "score", "depth", "stats"], defaults=[None])
+
+DEFAULT_PROGRESS_INTERVAL = 10000
+
+
+class SearchStats:
+    # What a search did, for tuning depth against time taken.
+    #   nodes, leaves       - positions visited, and those scored without
+    #                         searching further (depth 0 or the end of the game)
+    #   cutoffs             - number of alpha-beta cutoffs caused by the first,
+    #                         second, ... move searched at a node
+    #   tt_probes, tt_hits  - transposition table lookups and entries found,
+    #   tt_cutoffs            and entries whose score was used without searching
+    #   depth_times         - (depth, seconds, nodes) for every completed depth,
+    #                         times and nodes counted from the start of the search
+    #   principal_variation - moves expected from both players at the deepest
+    #                         completed depth
+    #
+    # In a parallel search the workers' leaves, cutoffs and table use aren't
+    # counted, and the principal variation is only the move chosen.
+    def __init__(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = []
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.depth = 0
+        self.elapsed = 0.0
+        self.depth_times = []
+        self.principal_variation = []
+
+
+    def get_branching_factor(self):
+        # Growth in nodes from one depth to the next, or the average number
+        # of moves searched per node with only one depth
+        if len(self.depth_times) >= 2:
+            nodes = [0] + [n for _, _, n in self.depth_times[-3:]]
+            previous_nodes = nodes[-2] - nodes[-3]
+            if previous_nodes > 0:
+                return (nodes[-1] - nodes[-2]) / previous_nodes
+        if self.depth > 0 and self.nodes > 0:
+            return self.nodes ** (1 / self.depth)
+        return 0.0
+
+
+    def get_first_move_cutoff_rate(self):
+        # Fraction of cutoffs caused by the first move searched, near 1 when
+        # moves are well ordered
+        total = sum(self.cutoffs)
+        return self.cutoffs[0] / total if total else 0.0
+
+
+    def __str__(self):
+        return f"depth {self.depth}, {self.nodes} nodes, {self.leaves} leaves in {self.elapsed:.3f}s, " \
+               f"branching factor {self.get_branching_factor():.2f}, " \
+               f"first move cutoffs {self.get_first_move_cutoff_rate():.0%}, " \
+               f"table hits {self.tt_hits}/{self.tt_probes}, pv {self.principal_variation}"
+
+
+# Raised inside the search when the time limit runs out
+class SearchTimeout(Exception):
+    pass
+
+
+# Raised out of search() when cancel() is called from another thread
+class SearchCancelled(SearchTimeout):
+    pass
+
+
+# Best (score, move index) found so far by any worker process in a
+# parallel search, and a flag set when the search is cancelled, set up
+# when each worker starts
+_shared_best = None
+_shared_cancelled = None
+
+
+def _init_worker(shared_best, shared_cancelled):
+    global _shared_best, _shared_cancelled
+    _shared_best = shared_best
+    _shared_cancelled = shared_cancelled
+
+
+def _search_root_move(board, options, depth, index, move, deadline):
+    # Search one root move in a worker process with its own copy of the board.
+    # Returns the move's score, or None if the deadline (wall clock time)
+    # passed or the search was cancelled.
+    agent = MinimaxAgent(board, depth, **options)
+    agent._cancel_flag = _shared_cancelled
+    agent._start_search()
+    agent._root_depth = depth
+    if deadline is not None:
+        agent._deadline = time.perf_counter() + deadline - time.time()
+
+    # Ties go to the move searched first in a serial search, so a move
+    # after the current best has to beat it while one before only has to equal it
+    with _shared_best.get_lock():
+        best_score, best_index = _shared_best[0], _shared_best[1]
+    alpha = best_score
+    if best_index > index:
+        alpha = np.nextafter(best_score, -np.inf)
+
+    board.play(move)
+    try:
+        _, score = agent._minimax(depth - 1, False, alpha, np.inf)
+    except SearchTimeout:
+        return index, None, agent.nodes
+
+    with _shared_best.get_lock():
+        if score > _shared_best[0] or (score == _shared_best[0] and index < _shared_best[1]):
+            _shared_best[0], _shared_best[1] = score, index
+    return index, score, agent.nodes
+
 
 class Agent:
     def __init__(self, board):
@@ -24,36 +146,377 @@ class RandAgent(Agent):
 
 
 class MinimaxAgent(Agent):
-    def __init__(self, board, depth=2):
+    # With max_time set the search deepens one ply at a time until the time
+    # runs out, instead of searching to a fixed depth.
+    #
+    # The move ordering options change the order moves are searched in,
+    # which only affects how much of the tree alpha-beta can prune:
+    #   centre_first      - search columns from the centre outwards
+    #   killer_moves      - first try moves which caused a cutoff at the same ply
+    #   history_heuristic - prefer moves which caused cutoffs anywhere in the tree
+    #
+    # An evaluator, such as Evaluation.WindowEvaluator, scores positions where
+    # the search stops before the end of the game. It is called with the board
+    # and the player to score for, and must return a value between -1 and 1.
+    # Without one those positions score 0.
+    #
+    # With workers > 1 the root moves are split across a pool of processes,
+    # which is kept until close() is called. The move chosen is the same as
+    # a serial search to the same depth would choose. The transposition table
+    # isn't used by a parallel search: each root move is searched by a new
+    # agent in whichever process is free, so a table there couldn't be kept
+    # between moves, and sharing one would make the result depend on timing.
+    #
+    # Positions in the opening book, if one is given, are played from the
+    # book without searching.
+    #
+    # With collect_stats a SearchStats is kept for every search, in stats and
+    # the SearchResult. A progress callback is called with the live stats
+    # every progress_interval nodes, and also turns on collecting stats.
+    def __init__(self, board, depth=2, tt_size=0, max_time=None,
+                 centre_first=False, killer_moves=False, history_heuristic=False,
+                 evaluator=None, workers=1, opening_book=None,
+                 collect_stats=False, progress=None, progress_interval=DEFAULT_PROGRESS_INTERVAL):
         self.board = board
         self.depth = depth
+        self.max_time = max_time
+        self.evaluator = evaluator
+        self.workers = workers
+        self.opening_book = opening_book
+        self.last_result = None
 
+        self._pool = None
+        self._shared_best = None
+        self._shared_cancelled = None
+        self._futures = []
+
+        self.centre_first = centre_first
+        self.killer_moves = killer_moves
+        self.history_heuristic = history_heuristic
+
+        # Number of positions visited by the last search
+        self.nodes = 0
+
+        self.collect_stats = collect_stats
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.stats = None
+        self._pv = None
+
+        self._deadline = None
+        self._cancelled = False
+        # Shared flag of a parallel search, polled by the worker processes
+        self._cancel_flag = None
+        self._root_depth = depth
+        self._root_move = None
+
+        # Optional transposition table, kept between moves of the same game
+        self.transposition_table = None
+        if tt_size > 0:
+            self.transposition_table = TranspositionTable(tt_size)
+
+
+    def new_game(self, board=None):
+        # Forget everything learnt about the previous game
+        if board is not None:
+            self.board = board
+        if self.transposition_table is not None:
+            self.transposition_table.clear()
+
+
+    def close(self):
+        # Shut down the worker processes
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+    def cancel(self):
+        # Stop a search running on another thread, which raises SearchCancelled.
+        # The worker processes of a parallel search stop at their next node.
+        # Searches keep being cancelled until clear_cancel() is called, so a
+        # cancel which arrives just before a search starts isn't lost.
+        self._cancelled = True
+
+        # Stop the worker processes of a parallel search too
+        if self._shared_cancelled is not None:
+            self._shared_cancelled.value = 1
+        for future in self._futures:
+            future.cancel()
+
+
+    def clear_cancel(self):
+        self._cancelled = False
+
+
+    def get_move(self, time_limit=None):
+        return self.search(time_limit).move
+
+
+    def predict_move(self):
+        # Best move in the board's current position according to the
+        # transposition table, such as the reply expected to the last move
+        # chosen, or None if it isn't known
+        if self.transposition_table is None or self.board.get_winner() != NO_PIECE:
+            return None
+        entry = self.transposition_table.probe(self._position_key())
+        if entry is None:
+            return None
+        return entry[4]
+
+
+    def search(self, time_limit=None):
+        if time_limit is None:
+            time_limit = self.max_time
+
+        if self.opening_book is not None:
+            book_entry = self.opening_book.lookup(self.board)
+            if book_entry is not None:
+                move, score = book_entry
+                self.last_result = SearchResult(move, score, self.opening_book.depth)
+                return self.last_result
+
+        self._start_search()
+
+        if time_limit is None:
+            self._root_depth = self.depth
+            self._root_move = None
+            turn_number = self.board.get_turn_number()
+            try:
+                move, score = self._root_search(self.depth)
+            except SearchCancelled:
+                while self.board.get_turn_number() > turn_number:
+                    self.board.undo()
+                raise
+            self._finish_depth(self.depth, move)
+            result = SearchResult(move, score, self.depth, self.stats)
+        else:
+            result = self._iterative_deepening(time_limit)
+
+        if self.stats is not None:
+            self._update_stats()
+        self.last_result = result
+        return result
+
+
+    def _iterative_deepening(self, time_limit):
+        start_time = time.perf_counter()
+        turn_number = self.board.get_turn_number()
+
+        # No point searching deeper than the number of empty cells
+        max_depth = self.board.get_width() * self.board.get_height() - turn_number
+
+        result = None
+        self._root_move = None
+        for depth in range(1, max(max_depth, 1) + 1):
+            # Always finish the first iteration so there is a move to play
+            if result is not None:
+                self._deadline = start_time + time_limit
+            self._root_depth = depth
+            try:
+                move, score = self._root_search(depth)
+            except SearchTimeout:
+                # Put the board back to how it was before the search
+                while self.board.get_turn_number() > turn_number:
+                    self.board.undo()
+                if self._cancelled:
+                    raise
+                break
+            finally:
+                self._deadline = None
+
+            self._finish_depth(depth, move)
+            result = SearchResult(move, score, depth, self.stats)
+
+            # Search this iteration's best move first in the next one
+            self._root_move = move
+
+            # A win or loss has been proven, searching deeper won't change it
+            if abs(score) >= 1 or time.perf_counter() - start_time >= time_limit:
+                break
+
+        self._root_move = None
+        return result
+
+
+    def _start_search(self):
+        # Move ordering statistics are kept between iterations of the same search
+        width = self.board.get_width()
+        self._killers = []
+        self._history = {PIECE1: [0] * width, PIECE2: [0] * width}
+        self._root_piece = self.board.get_turn()
+        self.nodes = 0
+
+        self.stats = None
+        if self.collect_stats or self.progress is not None:
+            self.stats = SearchStats()
+            self._search_start = time.perf_counter()
+            if self.transposition_table is not None:
+                self._table_counts = (self.transposition_table.probes, self.transposition_table.hits)
+
+
+    def _finish_depth(self, depth, move):
+        # Record a completed depth in the stats
+        stats = self.stats
+        if stats is None:
+            return
+
+        self._update_stats()
+        stats.depth = depth
+        stats.depth_times.append((depth, stats.elapsed, stats.nodes))
+        stats.principal_variation = list(self._pv[0]) if self._pv[0] else [move]
+
+
+    def _update_stats(self):
+        stats = self.stats
+        stats.nodes = self.nodes
+        stats.elapsed = time.perf_counter() - self._search_start
+        if self.transposition_table is not None:
+            stats.tt_probes = self.transposition_table.probes - self._table_counts[0]
+            stats.tt_hits = self.transposition_table.hits - self._table_counts[1]
+
+
+    def _root_search(self, depth):
+        # The principal variation from each ply to the end of the search
+        self._pv = [[] for ply in range(depth + 1)]
 
-    def get_move(self):
         moves = self.board.get_valid_moves()
-        move, _ = self._minimax(self.depth)
+        if self.workers <= 1 or len(moves) <= 1 or depth <= 1:
+            return self._minimax(depth)
+
+        if self._pool is None:
+            # Imported on first use, multiprocessing is slow to import
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._shared_best = multiprocessing.Array('d', 2)
+            self._shared_cancelled = multiprocessing.RawValue('b', 0)
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                             initargs=(self._shared_best, self._shared_cancelled))
+        self._shared_best[0], self._shared_best[1] = -np.inf, np.inf
+
+        # Give the workers the root moves in the order a serial search would use
+        moves = self._order_moves(moves, depth)
+        moves, forced = self._check_threats(moves, depth)
+        if forced is not None:
+            self.nodes += 1
+            return forced
+        if len(moves) == 1:
+            return self._minimax(depth)
+
+        options = {"tt_size": 0,
+                   "centre_first": self.centre_first,
+                   "killer_moves": self.killer_moves,
+                   "history_heuristic": self.history_heuristic,
+                   "evaluator": self.evaluator}
+        deadline = None
+        if self._deadline is not None:
+            deadline = time.time() + self._deadline - time.perf_counter()
+
+        # The first move is searched on its own to set alpha for the rest,
+        # which each start from the best score found when they're picked up
+        self._shared_cancelled.value = 0
+        if self._cancelled:
+            raise SearchCancelled()
+        self._futures = [self._pool.submit(_search_root_move, self.board, options, depth, 0, moves[0], deadline)]
+        results = self._collect_results()
+        if results[0][1] is not None:
+            self._futures = [self._pool.submit(_search_root_move, self.board, options, depth, i, move, deadline)
+                             for i, move in enumerate(moves) if i > 0]
+            results += self._collect_results()
+
+        self.nodes += 1 + sum(nodes for _, _, nodes in results)
+        if self._cancelled:
+            raise SearchCancelled()
+        if len(results) < len(moves) or any(score is None for _, score, _ in results):
+            raise SearchTimeout()
+
+        best_index = int(self._shared_best[1])
+        return moves[best_index], results[best_index][1]
+
+
+    def _collect_results(self):
+        # Wait for every root move submitted, skipping those cancelled
+        # before they started
+        from concurrent.futures import CancelledError
+
+        results = []
+        for future in self._futures:
+            try:
+                results.append(future.result())
+            except CancelledError:
+                pass
+        self._futures = []
+        return results
 
-        return move
 
     def _minimax(self, depth, myturn=True, alpha=-np.inf, beta=np.inf):
+        if self._cancelled or (self._cancel_flag is not None and self._cancel_flag.value):
+            raise SearchCancelled()
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+        self.nodes += 1
         moves = self.board.get_valid_moves()
 
+        stats = self.stats
+        if stats is not None:
+            ply = self._root_depth - depth
+            self._pv[ply] = []
+            if self.progress is not None and self.nodes % self.progress_interval == 0:
+                self._update_stats()
+                self.progress(stats)
+
         # Positive reward on my turn
         # Negative reward on opponents turn
         sign = [-1, 1][myturn]
 
         # Base case / game end condition
         if depth == 0 or len(moves) == 0:
+            if stats is not None:
+                stats.leaves += 1
+
             if self.board.get_winner() == NO_PIECE:
+                if self.evaluator is not None:
+                    return None, self.evaluator(self.board, self._root_piece)
                 return None, 0
             elif self.board.get_winner() == STALEMATE:
                 return None, 0
             else:
                 # Higher reward for victory in less turns
-                reward = depth + 1
+                reward = self._win_reward()
                 reward = reward * -sign
                 return None, reward
         else:
+            # Look the position up in the transposition table.
+            # Scores are stored relative to the player to move.
+            table = self.transposition_table
+            table_move = None
+            if table is not None:
+                key = self._position_key()
+                entry = table.probe(key)
+                if entry is not None:
+                    _, entry_depth, score, bound, table_move = entry
+                    if entry_depth >= depth:
+                        score = score * sign
+                        if not myturn:
+                            bound = FLIP_BOUND[bound]
+                        if bound == EXACT \
+                                or (bound == LOWER_BOUND and score >= beta) \
+                                or (bound == UPPER_BOUND and score <= alpha):
+                            if stats is not None:
+                                stats.tt_cutoffs += 1
+                            return table_move, score
+
+            moves = self._order_moves(moves, depth, table_move)
+            moves, forced = self._check_threats(moves, depth)
+            if forced is not None:
+                if stats is not None:
+                    stats.leaves += 1
+                    self._pv[ply] = [forced[0]]
+                return forced[0], sign * forced[1]
+
+            alpha_original, beta_original = alpha, beta
             best_reward = -sign * np.inf
             best_move = None
 
@@ -75,25 +538,133 @@ class MinimaxAgent(Agent):
                     if reward > best_reward:
                         best_reward = reward
                         best_move = move
+                        if stats is not None:
+                            self._pv[ply] = [move] + self._pv[ply + 1]
 
                         # Prune alpha
                         alpha = max(alpha, best_reward)
                         if alpha >= beta:
+                            self._record_cutoff(move, depth, m)
                             break
                 # Minimise if this is opponent's turn
                 else:
                     if reward < best_reward:
                         best_reward = reward
                         best_move = move
+                        if stats is not None:
+                            self._pv[ply] = [move] + self._pv[ply + 1]
 
                         # Prune beta
                         beta = min(beta, best_reward)
                         if beta <= alpha:
+                            self._record_cutoff(move, depth, m)
                             break
+
+            if table is not None:
+                if best_reward <= alpha_original:
+                    bound = UPPER_BOUND
+                elif best_reward >= beta_original:
+                    bound = LOWER_BOUND
+                else:
+                    bound = EXACT
+                if not myturn:
+                    bound = FLIP_BOUND[bound]
+                table.store(key, depth, best_reward * sign, bound, best_move)
                 
             return best_move, best_reward
 
 
+    def _order_moves(self, moves, depth, table_move=None):
+        if self.centre_first:
+            centre = self.board.get_width() - 1
+            moves.sort(key=lambda m: abs(2 * m - centre))
+
+        # Sorting is stable, so ties keep the centre first order
+        if self.history_heuristic:
+            history = self._history[self.board.get_turn()]
+            moves.sort(key=lambda m: -history[m])
+
+        if self.killer_moves:
+            ply = self._root_depth - depth
+            if ply < len(self._killers):
+                for killer in reversed(self._killers[ply]):
+                    if killer in moves:
+                        moves.remove(killer)
+                        moves.insert(0, killer)
+
+        # Try the previous iteration's best move first at the root,
+        # otherwise the best move from the transposition table
+        first = table_move
+        if depth == self._root_depth and self._root_move is not None:
+            first = self._root_move
+
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+
+    def _check_threats(self, moves, depth):
+        # Moves in search order, cut down to the block if the opponent
+        # threatens to win with their next counter, and the (move, score) for
+        # the player to move if the result is already known, otherwise None.
+        #
+        # Winning with the next counter is the best possible result, and with
+        # two threats to block nothing helps. Blocks are only forced when the
+        # search would see the opponent's win, so scores don't change, and
+        # ties go to the first move in search order as they would searching.
+        board = self.board
+        wins = board.winning_moves(board.get_turn())
+        if wins:
+            move = next(m for m in moves if m in wins)
+            return [move], (move, self._win_reward() - 1)
+
+        if depth >= 2:
+            blocks = board.must_block_moves()
+            if len(blocks) > 1:
+                move = next(m for m in moves if m in blocks)
+                return [move], (move, -(self._win_reward() - 2))
+            if blocks:
+                return blocks, None
+        return moves, None
+
+
+    def _record_cutoff(self, move, depth, index):
+        # index is the position of the move in the order searched
+        if self.stats is not None:
+            cutoffs = self.stats.cutoffs
+            while len(cutoffs) <= index:
+                cutoffs.append(0)
+            cutoffs[index] += 1
+
+        if self.killer_moves:
+            ply = self._root_depth - depth
+            while len(self._killers) <= ply:
+                self._killers.append([])
+
+            # Keep the two most recent killers for each ply
+            killers = self._killers[ply]
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[2:]
+
+        if self.history_heuristic:
+            self._history[self.board.get_turn()][move] += depth * depth
+
+
+    def _win_reward(self):
+        # Reward for the game having been won in the current position.
+        # This only depends on the number of counters played, not on how
+        # deep in the search the win was found, so scores can be reused
+        # between searches through the transposition table.
+        board = self.board
+        return board.get_width() * board.get_height() + 1 - board.get_turn_number()
+
+
+    def _position_key(self):
+        return self.board.position_key()
+
+
 # Run a short test game
 if __name__ == "__main__":
     board = Board(8, 8)
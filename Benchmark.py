@@ -0,0 +1,250 @@
+from Board import *
+from BitBoard import BitBoard
+from Agent import MinimaxAgent
+from Evaluation import WindowEvaluator
+from QLearning import QLearner
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Metric names end with their unit, which says which way is better:
+#   _per_s  - a rate, higher is better
+#   _s      - a time, lower is better
+#   _count  - a node count which must not change, a change is a bug
+# Anything else is recorded but never flagged.
+DEFAULT_THRESHOLD = 0.1
+
+BOARD_SIZES = [(4, 4), (7, 6), (8, 8)]
+BOARD_CLASSES = [Board, BitBoard]
+
+# 7x6 positions for the search benchmarks: the opening, early, middle and late game
+SEARCH_POSITIONS = {"opening": [],
+                    "early": [3, 3, 3, 3, 2, 4],
+                    "middle": [3, 2, 3, 3, 4, 4, 2, 5, 5, 1],
+                    "late": [3, 3, 2, 4, 4, 2, 3, 5, 1, 0, 6, 2, 2, 3, 4, 4, 0, 5]}
+
+# Modules timed importing in a new interpreter, which is what every worker
+# process and command line run pays before doing anything
+STARTUP_MODULES = ["Board", "BitBoard", "Agent", "QLearning", "Tournament", "Game"]
+
+GROUPS = ["board", "perft", "minimax", "qlearner", "startup"]
+
+
+def perft(board, depth):
+    # Number of move sequences of `depth` moves, or shorter if the game ends
+    if depth == 0 or board.get_winner() != NO_PIECE:
+        return 1
+
+    nodes = 0
+    for move in board.get_valid_moves():
+        board.play(move)
+        nodes += perft(board, depth - 1)
+        board.undo()
+    return nodes
+
+
+def time_call(function, number=1, repeat=3):
+    # Best time of `repeat` runs of calling the function `number` times,
+    # in seconds per call
+    best = np.inf
+    for r in range(repeat):
+        start_time = time.perf_counter()
+        for n in range(number):
+            function()
+        best = min(best, time.perf_counter() - start_time)
+    return best / number
+
+
+def random_games(board_class, width, height, n_games, seed=0):
+    # Move lists of random games, played to the end
+    rng = np.random.RandomState(seed)
+    games = []
+    for game in range(n_games):
+        board = board_class(width, height)
+        while board.get_winner() == NO_PIECE:
+            board.play(int(rng.choice(board.get_valid_moves())))
+        games.append(board.get_move_stack())
+    return games
+
+
+def bench_board(board_class, width, height, quick=False):
+    name = f"board/{board_class.__name__}/{width}x{height}"
+    games = random_games(board_class, width, height, 10 if quick else 50)
+    n_moves = sum(len(moves) for moves in games)
+    board = board_class(width, height)
+
+    def play_undo():
+        for moves in games:
+            for move in moves:
+                board.play(move)
+            for move in moves:
+                board.undo()
+
+    # Positions half way through each game
+    positions = []
+    for moves in games:
+        position = board_class(width, height)
+        for move in moves[:max(len(moves) // 2, 2)]:
+            position.play(move)
+        positions.append(position)
+
+    def valid_moves():
+        for position in positions:
+            position.get_valid_moves()
+
+    checks = [_win_check(position) for position in positions]
+
+    def win_check():
+        for check in checks:
+            check()
+
+    number = 1 if quick else 5
+    return {f"{name}/play_undo_per_s": 2 * n_moves / time_call(play_undo, number),
+            f"{name}/valid_moves_per_s": len(positions) / time_call(valid_moves, 20 * number),
+            f"{name}/win_check_per_s": len(positions) / time_call(win_check, 20 * number)}
+
+
+def _win_check(board):
+    # The win check the board made after the last move by the player to move
+    if isinstance(board, BitBoard):
+        bits = board._pieces[board.get_turn()]
+        return lambda: board._is_win(bits)
+    row, column = board._move_stack[-2][:2]
+    return lambda: board._check_end_condition(row, column)
+
+
+def bench_perft(board_class, depth):
+    name = f"perft/{board_class.__name__}/7x6/depth_{depth}"
+    board = board_class(7, 6)
+    start_time = time.perf_counter()
+    nodes = perft(board, depth)
+    seconds = time.perf_counter() - start_time
+    return {f"{name}/leaf_count": nodes,
+            f"{name}/leaves_per_s": nodes / seconds}
+
+
+def bench_minimax(max_depth=8):
+    # The agent as Game.py sets it up, on a fresh table for every search
+    results = dict()
+    for position, moves in SEARCH_POSITIONS.items():
+        for depth in range(1, max_depth + 1):
+            board = BitBoard(7, 6)
+            for move in moves:
+                board.play(move)
+            agent = MinimaxAgent(board, depth, tt_size=2 ** 18,
+                                 centre_first=True, killer_moves=True, history_heuristic=True,
+                                 evaluator=WindowEvaluator(7, 6))
+
+            start_time = time.perf_counter()
+            agent.search()
+            seconds = time.perf_counter() - start_time
+
+            name = f"minimax/{position}/depth_{depth}"
+            results[f"{name}/move_s"] = seconds
+            results[f"{name}/nodes"] = agent.nodes
+            results[f"{name}/nodes_per_s"] = agent.nodes / seconds
+    return results
+
+
+def bench_qlearner(rounds=20):
+    learner = QLearner(board_width=6, board_height=6, training_rounds=0)
+    start_time = time.perf_counter()
+    learner.train(rounds, seed=0)
+    seconds = time.perf_counter() - start_time
+    return {"qlearner/6x6/games_per_s": rounds / seconds,
+            "qlearner/6x6/states": len(learner.Q)}
+
+
+def bench_startup(quick=False):
+    # Seconds to start Python and import each module, with the time to start
+    # Python alone for comparison
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    def run(code):
+        subprocess.run([sys.executable, "-c", code], cwd=directory, check=True)
+
+    repeat = 1 if quick else 3
+    results = {"startup/python/start_s": time_call(lambda: run("pass"), repeat=repeat)}
+    for module in STARTUP_MODULES:
+        results[f"startup/{module}/import_s"] = time_call(lambda: run(f"import {module}"), repeat=repeat)
+    return results
+
+
+def run_benchmarks(groups=GROUPS, quick=False, max_depth=8):
+    results = dict()
+    if "board" in groups:
+        for board_class in BOARD_CLASSES:
+            for width, height in BOARD_SIZES:
+                results.update(bench_board(board_class, width, height, quick))
+    if "perft" in groups:
+        for board_class in BOARD_CLASSES:
+            for depth in range(1, (4 if quick else 6) + 1):
+                results.update(bench_perft(board_class, depth))
+    if "minimax" in groups:
+        results.update(bench_minimax(min(max_depth, 4) if quick else max_depth))
+    if "qlearner" in groups:
+        results.update(bench_qlearner(5 if quick else 20))
+    if "startup" in groups:
+        results.update(bench_startup(quick))
+
+    return {"python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "quick": quick,
+            "results": results}
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # Metrics which got worse than the baseline by more than the threshold,
+    # as (name, baseline value, new value, relative change)
+    regressions = []
+    old_results, new_results = baseline["results"], results["results"]
+    for name in sorted(set(old_results) & set(new_results)):
+        old, new = old_results[name], new_results[name]
+        if name.endswith("_count"):
+            worse = new != old
+        elif name.endswith("_per_s"):
+            worse = new < old * (1 - threshold)
+        elif name.endswith("_s"):
+            worse = new > old * (1 + threshold)
+        else:
+            continue
+
+        if worse:
+            change = (new - old) / old if old else np.inf
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark boards, search and training.")
+    parser.add_argument("--output", help="file to write the results to as JSON, otherwise they are printed")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slow down counted as a regression")
+    parser.add_argument("--groups", nargs="+", default=GROUPS, choices=GROUPS)
+    parser.add_argument("--max-depth", type=int, default=8, help="deepest minimax search")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and shallower searches")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.groups, args.quick, args.max_depth)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_results(results, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(f"Regression {name}: {old:.6g} -> {new:.6g} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,230 @@
+import numpy as np
+from Board import *
+
+
+def get_winning_cells(position, empty, height):
+    # Cells of `empty` which would complete a line for the counters in
+    # `position`, on bitboards with (height + 1) bits per column
+    result = (position << 1) & (position << 2) & (position << 3)
+    for shift in (height + 1, height, height + 2):
+        pair = (position << shift) & (position << (2 * shift))
+        result |= pair & (position << (3 * shift))
+        result |= pair & (position >> shift)
+        pair = (position >> shift) & (position >> (2 * shift))
+        result |= pair & (position << shift)
+        result |= pair & (position >> (3 * shift))
+    return result & empty
+
+
+class BitBoard:
+    # Drop-in replacement for Board which stores the position as one integer
+    # bitmask per player instead of a numpy array.
+    #
+    # Each column uses (height + 1) bits, bit 0 being the bottom cell. The
+    # extra bit on top of every column is always empty, which stops the
+    # shift-and-AND win checks from wrapping from one column into the next.
+    def __init__(self, width=DEFAULT_BOARD_WIDTH, height=DEFAULT_BOARD_HEIGHT, starting_player=PIECE1):
+        self._width, self._height = width, height
+        self._turn_count = 0
+        self._turn = starting_player
+        self._winner = NO_PIECE
+        self._move_stack = []
+
+        # One bitmask per piece, indexed by the piece value
+        self._pieces = [0, 0, 0]
+        self._column_heights = [0] * width
+
+        # Zobrist keys, the same as Board's
+        self._zobrist_cells, self._zobrist_turns = get_zobrist_keys(width, height)
+        self._key = 0
+        self._swapped_key = 0
+
+        # Shift for moving one step in each direction:
+        # vertical, horizontal, and the two diagonals
+        self._shifts = (1, height + 1, height, height + 2)
+
+        # Bottom cell of every column, and every cell
+        self._bottom = sum(1 << (c * (height + 1)) for c in range(width))
+        self._board_mask = self._bottom * ((1 << height) - 1)
+
+
+    def play(self, column):
+        # Play if no one has won yet
+        if self._winner == NO_PIECE:
+            # Validate column
+            if not np.isscalar(column):
+                raise TypeError("column must be of type int.")
+
+            # Check if there's room in this column for another counter
+            row = self._column_heights[column]
+            if row >= self._height:
+                # Todo: Add custom error
+                raise Warning("No more room in this column.")
+
+            # Place the counter in the lowest free cell
+            index = column * (self._height + 1) + row
+            self._pieces[self._turn] |= 1 << index
+            self._key ^= self._zobrist_cells[self._turn][index]
+            self._swapped_key ^= self._zobrist_cells[CHANGE_TURN[self._turn]][index]
+            self._column_heights[column] = row + 1
+
+            # Add the move to the move stack
+            self._move_stack.append(column)
+
+            # Check if there's a winner
+            self._turn_count += 1
+            if self._is_win(self._pieces[self._turn]):
+                self._winner = self._turn
+            elif self._turn_count == self._width * self._height:
+                self._winner = STALEMATE
+
+            # Deal with turns
+            if self._winner == NO_PIECE:
+                self._turn = CHANGE_TURN[self._turn]
+            else:
+                self._turn = NO_PIECE
+        else:
+            # Todo: Add custom error
+            raise Warning("The game has finished.")
+
+
+    def undo(self):
+        column = self._move_stack.pop()
+        row = self._column_heights[column] - 1
+        index = column * (self._height + 1) + row
+        bit = 1 << index
+
+        # Remove the counter from whichever player owns it
+        last_turn = PIECE1 if self._pieces[PIECE1] & bit else PIECE2
+        self._pieces[last_turn] &= ~bit
+        self._key ^= self._zobrist_cells[last_turn][index]
+        self._swapped_key ^= self._zobrist_cells[CHANGE_TURN[last_turn]][index]
+        self._column_heights[column] = row
+
+        # A game can't continue past a win, so the previous position
+        # never has a winner
+        self._winner = NO_PIECE
+
+        # Deal with turns
+        self._turn_count -= 1
+        self._turn = last_turn
+
+
+    def get_valid_moves(self):
+        if self._winner != NO_PIECE:
+            return []
+        return [c for c in range(self._width) if self._column_heights[c] < self._height]
+
+
+    def get_board(self):
+        # Build the same (height, width) array that Board uses, row 0 at the top
+        board = np.full((self._height, self._width), NO_PIECE).astype(np.uint8)
+        for piece in (PIECE1, PIECE2):
+            bits = self._pieces[piece]
+            for column in range(self._width):
+                for row in range(self._column_heights[column]):
+                    if bits >> (column * (self._height + 1) + row) & 1:
+                        board[self._height - 1 - row, column] = piece
+        return board
+
+
+    def get_width(self):
+        return self._width
+
+
+    def get_height(self):
+        return self._height
+
+
+    def get_turn(self):
+        return self._turn
+
+
+    def get_turn_number(self):
+        return self._turn_count
+
+
+    def get_winner(self):
+        return self._winner
+
+
+    def get_move_stack(self):
+        return list(self._move_stack)
+
+
+    def winning_moves(self, player):
+        # See Board.winning_moves
+        if self._winner != NO_PIECE:
+            return []
+        return self._columns(self._winning_cells(self._pieces[player]) & self._possible())
+
+
+    def is_winning_move(self, column):
+        # See Board.is_winning_move
+        if self._winner != NO_PIECE or self._column_heights[column] >= self._height:
+            return False
+        move = 1 << (column * (self._height + 1) + self._column_heights[column])
+        return bool(self._winning_cells(self._pieces[self._turn]) & move)
+
+
+    def must_block_moves(self):
+        # See Board.must_block_moves
+        if self._winner != NO_PIECE:
+            return []
+        return self.winning_moves(CHANGE_TURN[self._turn])
+
+
+    def is_losing_move(self, column):
+        # See Board.is_losing_move
+        if self._winner != NO_PIECE:
+            raise Warning("The game has finished.")
+        row = self._column_heights[column]
+        if row >= self._height:
+            raise Warning("No more room in this column.")
+
+        move = 1 << (column * (self._height + 1) + row)
+        if self._winning_cells(self._pieces[self._turn]) & move or self._turn_count + 1 == self._width * self._height:
+            return False
+
+        # Cells the opponent could play after the move
+        possible = (self._possible() ^ move) | ((move << 1) & self._board_mask)
+        return bool(self._winning_cells(self._pieces[CHANGE_TURN[self._turn]]) & possible)
+
+
+    def get_bitboards(self):
+        # The counters of the player to move and all the counters, laid out
+        # as described above
+        return self._pieces[self._turn], self._pieces[PIECE1] | self._pieces[PIECE2]
+
+
+    def position_key(self, relative=False):
+        # See Board.position_key
+        if relative:
+            return self._swapped_key if self._turn == PIECE2 else self._key
+        return self._key ^ self._zobrist_turns[self._turn]
+
+
+    def _possible(self):
+        # The lowest empty cell of every column with room left
+        return (self._pieces[PIECE1] + self._pieces[PIECE2] + self._bottom) & self._board_mask
+
+
+    def _winning_cells(self, bits):
+        # Empty cells which would complete a line for the counters in bits
+        empty = self._board_mask ^ (self._pieces[PIECE1] | self._pieces[PIECE2])
+        return get_winning_cells(bits, empty, self._height)
+
+
+    def _columns(self, cells):
+        # Columns with any of the cells in them
+        column_mask = (1 << (self._height + 1)) - 1
+        return [c for c in range(self._width) if cells >> (c * (self._height + 1)) & column_mask]
+
+
+    def _is_win(self, bits):
+        # Pairs of adjacent counters, then pairs of pairs, in each direction
+        for shift in self._shifts:
+            pairs = bits & (bits >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
@@ -1,5 +1,4 @@
 import numpy as np
-from scipy.ndimage import convolve
 
 # Board Constants
 DEFAULT_BOARD_WIDTH, DEFAULT_BOARD_HEIGHT = 8, 8
@@ -13,6 +12,49 @@ CHANGE_TURN = {PIECE1: PIECE2, PIECE2: PIECE1}
 
 NUM_IN_A_ROW = 4
 
+# (row, column) steps for horizontal, vertical and both diagonal lines
+LINE_DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+# Lines through each cell of each board size, see _get_cell_lines
+_cell_lines = dict()
+
+# Zobrist keys of each board size, see get_zobrist_keys
+ZOBRIST_SEED = 4
+_zobrist_keys = dict()
+
+
+def get_zobrist_keys(width, height):
+    # Random 64 bit keys for hashing positions: cells[piece][index] for a
+    # counter of the piece in the cell at index column * (height + 1) + row,
+    # row 0 being the bottom, and turns[piece] for the player to move. The
+    # same seed is used every time, so keys agree between boards and processes.
+    if (width, height) not in _zobrist_keys:
+        rng = np.random.default_rng([ZOBRIST_SEED, width, height])
+        n_cells = width * (height + 1)
+        keys = rng.integers(0, 2 ** 64, size=2 * n_cells + 3, dtype=np.uint64).tolist()
+        cells = [None, keys[:n_cells], keys[n_cells:2 * n_cells]]
+        _zobrist_keys[width, height] = cells, keys[2 * n_cells:]
+    return _zobrist_keys[width, height]
+
+
+def _get_cell_lines(width, height):
+    # For each cell of a flattened (height, width) board, the other three
+    # cells of every line of NUM_IN_A_ROW through it
+    if (width, height) not in _cell_lines:
+        lines = [[] for i in range(width * height)]
+        for row in range(height):
+            for column in range(width):
+                for d_row, d_col in LINE_DIRECTIONS:
+                    end_row = row + (NUM_IN_A_ROW - 1) * d_row
+                    end_column = column + (NUM_IN_A_ROW - 1) * d_col
+                    if not (0 <= end_row < height and 0 <= end_column < width):
+                        continue
+                    line = [(row + i * d_row) * width + column + i * d_col for i in range(NUM_IN_A_ROW)]
+                    for cell in line:
+                        lines[cell].append(tuple(c for c in line if c != cell))
+        _cell_lines[width, height] = lines
+    return _cell_lines[width, height]
+
 
 class Board:
     def __init__(self, width=DEFAULT_BOARD_WIDTH, height=DEFAULT_BOARD_HEIGHT, starting_player=PIECE1):
@@ -24,6 +66,17 @@ class Board:
         self._width, self._height = width, height
         self._move_stack = []
 
+        # Number of counters in each column and the columns with room left
+        self._column_heights = [0] * width
+        self._valid_moves = list(range(width))
+        self._cell_lines = _get_cell_lines(width, height)
+
+        # Zobrist keys of the counters, and of the counters with the players
+        # swapped, kept up to date by play and undo
+        self._zobrist_cells, self._zobrist_turns = get_zobrist_keys(width, height)
+        self._key = 0
+        self._swapped_key = 0
+
 
     def play(self, column):
         # Play if no one has won yet
@@ -31,28 +84,31 @@ class Board:
             # Validate column
             if not np.isscalar(column):
                 raise TypeError("column must be of type int.")
-            
-            # Get a view into selected column
-            col = self._board[:, column]
 
             # Check if there's room in this column for another counter
-            if not 0 in col:
+            height = self._column_heights[column]
+            if height >= self._height:
                 # Todo: Add custom error
                 raise Warning("No more room in this column.")
 
             # Find the last row that doesn't have a counter and play
             # (acts like gravity)
-            row = np.max(np.where(col == 0))
+            row = self._height - 1 - height
             self._board[row, column] = self._turn
+            self._update_key(self._turn, column * (self._height + 1) + height)
+            self._column_heights[column] = height + 1
+            if height + 1 == self._height:
+                self._valid_moves.remove(column)
 
-            # Add the move to the move stack
-            self._move_stack.append((row, column))
+            # Add the move to the move stack along with the state needed
+            # to undo it
+            self._move_stack.append((row, column, self._turn, self._winner))
 
             # Check if there's a winner
-            self._winner = self._check_end_condition()
-            
-            # Deal with turns
             self._turn_count += 1
+            self._winner = self._check_end_condition(row, column)
+
+            # Deal with turns
             if self._winner == NO_PIECE:
                 self._turn = CHANGE_TURN[self._turn]
             else:
@@ -63,33 +119,39 @@ class Board:
 
 
     def undo(self):
-        row, column = self._move_stack.pop()
-        last_turn = self._board[row, column]
+        row, column, last_turn, last_winner = self._move_stack.pop()
         self._board[row, column] = NO_PIECE
-        
-        # Remove the winner
-        if self._winner != NO_PIECE:
-            self._winner = NO_PIECE
-            self._winner = self._check_end_condition()
-            
-        # Deal with turns
+        self._update_key(last_turn, column * (self._height + 1) + self._height - 1 - row)
+
+        if self._column_heights[column] == self._height:
+            self._valid_moves.append(column)
+            self._valid_moves.sort()
+        self._column_heights[column] -= 1
+
+        # Restore the winner and turns
+        self._winner = last_winner
         self._turn_count -= 1
         self._turn = last_turn
-    
+
 
     def get_valid_moves(self):
-        moves = np.array([])
-        if self._winner == NO_PIECE:
-            moves_mask = np.any(self._board == 0, axis=0)
-            moves = np.arange(self._width)[moves_mask]
-        moves = [int(a) for a in moves]
-        return moves
+        if self._winner != NO_PIECE:
+            return []
+        return list(self._valid_moves)
 
 
     def get_board(self):
         return self._board
 
 
+    def get_width(self):
+        return self._width
+
+
+    def get_height(self):
+        return self._height
+
+
     def get_turn(self):
         return self._turn
 
@@ -103,43 +165,110 @@ class Board:
 
 
     def get_move_stack(self):
-        return [col for _, col in self._move_stack]
+        return [move[1] for move in self._move_stack]
 
-    
-    def _check_end_condition(self):
-        # Default no winner
-        winner = NO_PIECE
 
-        # Check both colours
-        # Consider only this piece
-        mask = (self._board == self.get_turn()).astype(np.int8)
+    def winning_moves(self, player):
+        # Columns the player would win by playing next, whoever's turn it is
+        if self._winner != NO_PIECE:
+            return []
+        cells = self._board.ravel().tolist()
+        return [c for c in self._valid_moves if self._is_winning_cell(cells, self._next_cell(c), player)]
+
 
-        # Set up kernels to count the number of counters
-        # in each direction
-        kernel_horizontal = np.ones(shape=(1, NUM_IN_A_ROW))
-        kernel_vertical = np.ones(shape=(NUM_IN_A_ROW, 1))
-        kernel_diag1 = np.eye(NUM_IN_A_ROW)
-        kernel_diag2 = np.rot90(kernel_diag1)
+    def is_winning_move(self, column):
+        # Whether the player to move wins by playing the column
+        if self._winner != NO_PIECE or self._column_heights[column] >= self._height:
+            return False
+        return self._is_winning_cell(self._board.ravel().tolist(), self._next_cell(column), self._turn)
 
-        # Convolve the masked board with each kernel
-        kernels = [kernel_horizontal, kernel_vertical, kernel_diag1, kernel_diag2]
-        counts = [convolve(mask, kernel, mode='constant', cval=0.0) for kernel in kernels]
 
-        # Where the convolved board is equal to the winning number
-        # this means that a row of winning counters was found
-        res = np.any(np.array(counts) >= NUM_IN_A_ROW)
+    def must_block_moves(self):
+        # Columns the player to move has to play to stop the opponent
+        # winning with their next counter
+        if self._winner != NO_PIECE:
+            return []
+        return self.winning_moves(CHANGE_TURN[self._turn])
 
-        # Todo: Identify the winning position(s)
 
-        if res:
-            winner = self.get_turn()
+    def is_losing_move(self, column):
+        # Whether playing the column lets the opponent win with their next counter
+        if self._winner != NO_PIECE:
+            raise Warning("The game has finished.")
+        if self._column_heights[column] >= self._height:
+            raise Warning("No more room in this column.")
+
+        cells = self._board.ravel().tolist()
+        cell = self._next_cell(column)
+        if self._is_winning_cell(cells, cell, self._turn) or self._turn_count + 1 == self._width * self._height:
+            return False
+
+        # The opponent wins in the cell freed up above the counter, or one
+        # they could already play
+        opponent = CHANGE_TURN[self._turn]
+        if cell >= self._width and self._is_winning_cell(cells, cell - self._width, opponent):
+            return True
+        return any(self._is_winning_cell(cells, self._next_cell(c), opponent)
+                   for c in self._valid_moves if c != column)
+
+
+    def position_key(self, relative=False):
+        # 64 bit Zobrist hash of the position and the player to move. A
+        # relative key is from the point of view of the player to move, so
+        # positions with the colours swapped share a key.
+        if relative:
+            return self._swapped_key if self._turn == PIECE2 else self._key
+        return self._key ^ self._zobrist_turns[self._turn]
+
+
+    def _update_key(self, piece, index):
+        # Add or remove a counter of the piece
+        self._key ^= self._zobrist_cells[piece][index]
+        self._swapped_key ^= self._zobrist_cells[CHANGE_TURN[piece]][index]
+
+
+    def _check_end_condition(self, row, column):
+        # Only lines through the counter just placed can have been completed
+        piece = self._turn
+        for d_row, d_col in LINE_DIRECTIONS:
+            count = 1 + self._count_direction(row, column, d_row, d_col, piece) \
+                      + self._count_direction(row, column, -d_row, -d_col, piece)
+            if count >= NUM_IN_A_ROW:
+                return piece
 
         # The result is stalemate if there are no moves
-        if winner == NO_PIECE and len(self.get_valid_moves()) == 0:
-            winner = STALEMATE
-        
-        return winner
-        
+        if self._turn_count == self._width * self._height:
+            return STALEMATE
+
+        return NO_PIECE
+
+
+    def _next_cell(self, column):
+        # Index into the flattened board of the cell a counter in the column lands in
+        return (self._height - 1 - self._column_heights[column]) * self._width + column
+
+
+    def _is_winning_cell(self, cells, cell, piece):
+        # Whether a counter of the piece in the cell would complete a line,
+        # cells being the flattened board
+        for a, b, c in self._cell_lines[cell]:
+            if cells[a] == piece and cells[b] == piece and cells[c] == piece:
+                return True
+        return False
+
+
+    def _count_direction(self, row, column, d_row, d_col, piece):
+        # Count the consecutive counters of this piece starting
+        # one step away from (row, column)
+        board = self._board
+        count = 0
+        row, column = row + d_row, column + d_col
+        while 0 <= row < self._height and 0 <= column < self._width \
+                and board[row, column] == piece:
+            count += 1
+            row, column = row + d_row, column + d_col
+        return count
+
 
 
 
@@ -0,0 +1,144 @@
+from Board import *
+import numpy as np
+
+# Empty cells kept around the edge of every board, so that the cells on a
+# line through any counter can be read without going out of bounds
+_PADDING = NUM_IN_A_ROW - 1
+
+
+class BoardBatch:
+    # Many games of the same size played in lockstep, stored as one
+    # (n_games, height, width) array. Each call to play() makes one move in
+    # every game which hasn't finished yet.
+    def __init__(self, n_games, width=DEFAULT_BOARD_WIDTH, height=DEFAULT_BOARD_HEIGHT, starting_player=PIECE1):
+        self._n_games = n_games
+        self._width, self._height = width, height
+
+        self._padded_boards = np.zeros((n_games, height + 2 * _PADDING, width + 2 * _PADDING), dtype=np.uint8)
+        self._boards = self._padded_boards[:, _PADDING:-_PADDING, _PADDING:-_PADDING]
+        self._flat_boards = self._padded_boards.reshape(-1)
+
+        # Flat offsets from a cell to the cells on each line through it,
+        # shape (4, 2 * NUM_IN_A_ROW - 1)
+        padded_width = width + 2 * _PADDING
+        steps = np.array([d_row * padded_width + d_col for d_row, d_col in LINE_DIRECTIONS])
+        self._line_offsets = steps[:, None] * np.arange(-_PADDING, _PADDING + 1)
+        self._column_heights = np.zeros((n_games, width), dtype=np.int16)
+        self._turns = np.full(n_games, starting_player, dtype=np.uint8)
+        self._turn_counts = np.zeros(n_games, dtype=np.int16)
+        self._winners = np.full(n_games, NO_PIECE, dtype=np.int8)
+
+        # Columns played in each game, -1 after the end of the game
+        self._moves = np.full((n_games, width * height), -1, dtype=np.int8)
+
+
+    def play(self, columns):
+        # Play columns[i] in game i. Entries for finished games are ignored.
+        # Returns a mask of the games which finished on this move.
+        columns = np.asarray(columns)
+        games = np.flatnonzero(self._winners == NO_PIECE)
+        columns = columns[games].astype(np.intp)
+
+        if np.any((columns < 0) | (columns >= self._width)):
+            raise IndexError("column out of range.")
+
+        heights = self._column_heights[games, columns]
+        if np.any(heights >= self._height):
+            # Todo: Add custom error
+            raise Warning("No more room in this column.")
+
+        # Drop the counters in and record the moves
+        rows = self._height - 1 - heights
+        turns = self._turns[games]
+        self._boards[games, rows, columns] = turns
+        self._column_heights[games, columns] += 1
+        self._moves[games, self._turn_counts[games]] = columns
+        self._turn_counts[games] += 1
+
+        # Check for winners, then stalemates
+        won = self._check_wins(games, rows, columns, turns)
+        full = self._turn_counts[games] == self._width * self._height
+        self._winners[games[won]] = turns[won]
+        self._winners[games[full & ~won]] = STALEMATE
+
+        # Deal with turns, PIECE1 + PIECE2 - turn being the other player
+        finished = won | full
+        self._turns[games] = np.where(finished, NO_PIECE, PIECE1 + PIECE2 - turns)
+
+        finished_mask = np.zeros(self._n_games, dtype=bool)
+        finished_mask[games[finished]] = True
+        return finished_mask
+
+
+    def random_moves(self, rng=np.random):
+        # A uniformly random valid column for every game, -1 for finished games
+        keys = rng.random_sample((self._n_games, self._width))
+        keys[~self.get_valid_moves()] = -1
+        moves = np.argmax(keys, axis=1)
+        moves[self._winners != NO_PIECE] = -1
+        return moves
+
+
+    def play_out(self, policy=None, rng=np.random):
+        # Play every game to the end. policy is called with this batch and
+        # returns a column for every game, the default being random moves.
+        while not np.all(self.get_finished()):
+            if policy is None:
+                columns = self.random_moves(rng)
+            else:
+                columns = policy(self)
+            self.play(columns)
+        return self.get_winners()
+
+
+    def get_valid_moves(self):
+        # (n_games, width) mask of the columns which can be played
+        valid = self._column_heights < self._height
+        valid[self._winners != NO_PIECE] = False
+        return valid
+
+
+    def get_boards(self):
+        return self._boards
+
+
+    def get_width(self):
+        return self._width
+
+
+    def get_height(self):
+        return self._height
+
+
+    def get_turns(self):
+        return self._turns
+
+
+    def get_turn_numbers(self):
+        return self._turn_counts
+
+
+    def get_winners(self):
+        return self._winners
+
+
+    def get_finished(self):
+        return self._winners != NO_PIECE
+
+
+    def get_move_stacks(self):
+        # (n_games, width * height) array of the columns played, padded with -1
+        return self._moves
+
+
+    def _check_wins(self, games, rows, columns, turns):
+        # Cells on each line through the new counters, shape (games, 4, 7)
+        _, padded_height, padded_width = self._padded_boards.shape
+        cells = games * (padded_height * padded_width) \
+              + (rows + _PADDING) * padded_width + columns + _PADDING
+        lines = self._flat_boards[cells[:, None, None] + self._line_offsets]
+        mine = lines == turns[:, None, None]
+
+        # Look for any run of four along each line
+        run = mine[:, :, :-3] & mine[:, :, 1:-2] & mine[:, :, 2:-1] & mine[:, :, 3:]
+        return run.any(axis=(1, 2))
@@ -0,0 +1,49 @@
+from Board import *
+import numpy as np
+
+# Score for a window holding this many of one player's counters
+# and none of the opponent's. Counting single counters rewards taking
+# the centre, which is part of the most windows.
+WINDOW_WEIGHTS = [0, 1, 4, 16, 0]
+
+
+def get_windows(width, height, length=NUM_IN_A_ROW):
+    # Flat indices into a (height, width) board of every line of
+    # `length` cells, one row per window
+    cells = np.arange(width * height).reshape(height, width)
+    windows = []
+    for d_row, d_col in LINE_DIRECTIONS:
+        for row in range(height):
+            for column in range(width):
+                end_row = row + d_row * (length - 1)
+                end_column = column + d_col * (length - 1)
+                if 0 <= end_row < height and 0 <= end_column < width:
+                    windows.append([cells[row + d_row * i, column + d_col * i] for i in range(length)])
+    return np.array(windows, dtype=np.intp).reshape(-1, length)
+
+
+class WindowEvaluator:
+    # Scores a position by counting the open ones, twos and threes of each player.
+    # A window only counts if the other player has no counters in it, since
+    # otherwise it can never become four in a row.
+    #
+    # Scores are scaled to lie strictly between -1 and 1 so that they are
+    # always smaller than the reward for a win found by the search.
+    def __init__(self, width=DEFAULT_BOARD_WIDTH, height=DEFAULT_BOARD_HEIGHT, weights=WINDOW_WEIGHTS):
+        self.width, self.height = width, height
+        self._windows = get_windows(width, height)
+
+        # Look up table from (mine * 5 + theirs) to the window's score
+        n = NUM_IN_A_ROW + 1
+        table = np.zeros(n * n)
+        for count in range(n):
+            table[count * n] = weights[count]
+            table[count] = -weights[count]
+        self._scores = table / (len(self._windows) * max(weights) + 1)
+
+
+    def __call__(self, board, piece):
+        cells = board.get_board().ravel()[self._windows]
+        mine = np.count_nonzero(cells == piece, axis=1)
+        theirs = np.count_nonzero(cells == CHANGE_TURN[piece], axis=1)
+        return float(self._scores[mine * (NUM_IN_A_ROW + 1) + theirs].sum())
@@ -1,146 +1,154 @@
-import pygame
-from pygame.locals import *
+import os
 import sys
-import numpy as np
 from Board import *
+from BitBoard import BitBoard
 from Agent import RandAgent, MinimaxAgent
-
-pygame.init()
+from AIWorker import AIWorker
+from Evaluation import WindowEvaluator
+from OpeningBook import OpeningBook
+from GameRecord import GameWriter
 
 SCREEN_WIDTH, SCREEN_HEIGHT = SCREEN_SIZE = 960, 720
-WHITE = pygame.Color(255, 255, 255)
-BLACK = pygame.Color(0, 0, 0)
-RED = pygame.Color(255, 0, 0)
-GREEN = pygame.Color(0, 255, 0)
-GOLD = pygame.Color(255, 255, 0)
-BLUE = pygame.Color(0, 0, 255)
-LIGHT_BLUE = pygame.Color(100, 100, 255)
-GREY = pygame.Color(127, 127, 127)
-
-counter_sound = pygame.mixer.Sound("counter.ogg")
-counter_sound.set_volume(0.1)
-
-window = pygame.display.set_mode(SCREEN_SIZE)
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+GOLD = (255, 255, 0)
+BLUE = (0, 0, 255)
+LIGHT_BLUE = (100, 100, 255)
+GREY = (127, 127, 127)
 
 w, h = 6, 6
 start = PIECE2
-board = Board(h, w, start)
-
-depth = 7
-agent = MinimaxAgent(board, depth)
-
-def draw_board(surface, board, back_colour, empty_colour, counter1_colour, counter2_colour, rect):
-    x, y, width, height = rect
-    board_arr = board.get_board()
-    board_height, board_width = board_arr.shape
-
-    pygame.draw.rect(surface, back_colour, rect)
-
-    diameter = int(np.min([(1 / board_width) * width, (1 / board_height) * height]))
-    radius = diameter // 2
-    for i in range(board_width):
-        for j in range(board_height):
-            v = board_arr[j, i]
-            if v == 0:
-                colour = empty_colour
-            elif v == PIECE1:
-                colour = counter1_colour
-            elif v == PIECE2:
-                colour = counter2_colour
-                
-            xpos = x + int((i / board_width) * width + radius)
-            ypos = y + int((j / board_height) * height + radius)
-            pygame.draw.circle(surface, colour, (xpos, ypos), radius)
-
-    winner = board.get_winner()
-    if winner != NO_PIECE:
-        outline_width = np.min([width, height]) // 64
-        
-        if winner == PIECE1:
-            colour = counter1_colour
-        elif winner == PIECE2:
-            colour = counter2_colour
-        elif winner == STALEMATE:
-            colour = GREY
-            
-        pygame.draw.rect(surface, colour, rect, outline_width)
-
-    # Return a list of rects, one for each column
-    x_coords = [x + int((i / board_width) * width) for i in range(board_width)]
-    rects = [pygame.Rect(a, y, diameter, height) for a in x_coords]
-
-    return rects
-
-    
-
-    
-
-do_loop = True
-do_update = True
-selected_column = -1
-board_rects = []
-while do_loop:
-    
-    # Handle Pygame events
-    for event in pygame.event.get():
-        if event.type == QUIT:
-            # Exit when close button is pressed
-            do_loop = False
-
-        elif event.type == MOUSEMOTION:
-            # Check if the mouse is in any of the columns
-            flag = False
-            for r in range(len(board_rects)):
-                if board_rects[r].collidepoint(event.pos):
-                    selected_column = r
-                    flag = True
-                    do_update = True
-            if not flag:
-                selected_column= -1
-
-        elif event.type == MOUSEBUTTONDOWN:
-            # If a column is selected and nobody has won, play this column
-            if selected_column != -1 and board.get_turn() == PIECE1:
-                # Try placing in this column
-                try:
-                    res = board.play(selected_column)
-                    counter_sound.play()
-                except:
-                    # Todo: play a sound on failure
-                    pass
-                do_update = True
-
-        elif event.type == KEYDOWN:
-            # Reset the board and start a new game
-            if event.key == K_r:
-                # Record the game
-                with open("games.txt", "a") as games_log:
-                    games_log.write(str(board.get_move_stack()) + "\n")
-                board = Board(h, w, start)
-                agent = MinimaxAgent(board, depth)
-                do_update = True
-            if event.key == K_u:
-                board.undo()
-                board.undo()
-            # Exit
-            if event.key == K_ESCAPE:
-                do_loop = False
+# Board engine used for the game, either Board or BitBoard
+board_class = BitBoard
+
+depth = 5
+tt_size = 2 ** 18
+# Seconds per move, set to search to a time budget instead of a fixed depth
+max_time = None
+# Search replies to the player's moves while they're thinking
+ponder = True
+# Opening book built by OpeningBook.py for this board size, used if present
+opening_book_file = "book.bin"
+
+# Frames per second, the loop sleeps between frames
+fps = 60
+
+
+def main():
+    # pygame is only loaded to play, so the settings above and the rest of
+    # the package can be imported without it or a display
+    import pygame
+    from Renderer import BoardRenderer
+
+    pygame.init()
 
-    turn = board.get_turn()
-    if turn == PIECE2:
-        move = agent.get_move()
-        board.play(move)
-    
-    if do_update:
-        window.fill(BLACK)
-        board_rects=draw_board(window, board, LIGHT_BLUE, WHITE, BLUE, RED, (16, 16, SCREEN_WIDTH-32, SCREEN_HEIGHT-32))
+    counter_sound = pygame.mixer.Sound("counter.ogg")
+    counter_sound.set_volume(0.1)
 
-        if selected_column != -1:
-            pygame.draw.rect(window, GOLD, board_rects[selected_column], 4)
-        
-        pygame.display.update()
-        do_update = False
+    window = pygame.display.set_mode(SCREEN_SIZE)
 
+    board = board_class(h, w, start)
+
+    opening_book = None
+    if os.path.exists(opening_book_file):
+        opening_book = OpeningBook.load(opening_book_file)
+
+    agent = MinimaxAgent(board, depth, tt_size=tt_size, max_time=max_time, opening_book=opening_book,
+                         centre_first=True, killer_moves=True, history_heuristic=True,
+                         evaluator=WindowEvaluator(board.get_width(), board.get_height()))
+
+    # The agent searches on a background thread so the window stays responsive
+    ai_worker = AIWorker(agent)
+
+    # Games are recorded when the board is reset, see GameRecord.read_games
+    game_writer = GameWriter("games.bin")
+
+    clock = pygame.time.Clock()
+    renderer = BoardRenderer(board.get_width(), board.get_height(), (16, 16, SCREEN_WIDTH-32, SCREEN_HEIGHT-32),
+                             LIGHT_BLUE, WHITE, BLUE, RED, GOLD, GREY)
+    window.fill(BLACK)
+    pygame.display.update()
+
+    do_loop = True
+    selected_column = -1
+    board_rects = renderer.column_rects()
+    while do_loop:
+
+        # Handle Pygame events
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                # Exit when close button is pressed
+                do_loop = False
 
-pygame.quit()
-sys.exit()
+            elif event.type == pygame.MOUSEMOTION:
+                # Check if the mouse is in any of the columns
+                flag = False
+                for r in range(len(board_rects)):
+                    if board_rects[r].collidepoint(event.pos):
+                        selected_column = r
+                        flag = True
+                if not flag:
+                    selected_column= -1
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                # If a column is selected and nobody has won, play this column
+                if selected_column != -1 and board.get_turn() == PIECE1:
+                    # Try placing in this column
+                    try:
+                        res = board.play(selected_column)
+                        counter_sound.play()
+                    except:
+                        # Todo: play a sound on failure
+                        pass
+
+            elif event.type == pygame.KEYDOWN:
+                # Reset the board and start a new game
+                if event.key == pygame.K_r:
+                    # Record the game
+                    if board.get_turn_number() > 0:
+                        game_writer.write_board(board, start)
+                        game_writer.flush()
+                    board = board_class(h, w, start)
+                    ai_worker.new_game()
+                if event.key == pygame.K_u:
+                    # Take back the player's last move, and the agent's reply
+                    # if it has made one. The worker clears the agent's cancel
+                    # itself before its next search.
+                    ai_worker.cancel()
+                    n_moves = board.get_turn_number()
+                    last_player = start if n_moves % 2 == 1 else CHANGE_TURN[start]
+                    for i in range(min(1 if last_player == PIECE1 else 2, n_moves)):
+                        board.undo()
+                # Exit
+                if event.key == pygame.K_ESCAPE:
+                    do_loop = False
+
+        # Ask for a move on the agent's turn, and play it once it's found
+        turn = board.get_turn()
+        if turn == PIECE2:
+            if not ai_worker.is_thinking():
+                ai_worker.request_move(board)
+            move = ai_worker.poll()
+            if move is not None:
+                board.play(move)
+        elif turn == PIECE1 and ponder and not ai_worker.is_pondering():
+            ai_worker.ponder(board)
+
+        # Only the parts of the window which changed are drawn and updated
+        dirty_rects = renderer.draw(window, board, selected_column)
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+
+        clock.tick(fps)
+
+
+    ai_worker.close()
+    game_writer.close()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit()
@@ -0,0 +1,113 @@
+from Board import *
+from collections import namedtuple
+import struct
+
+# File layout, all little endian: a file header, then one record per game.
+# A record is a header holding the board size, the starting player, the
+# winner (NO_PIECE if the game wasn't finished) and the number of moves,
+# then the columns played packed two to a byte, the first in the low 4 bits.
+# Files are only ever appended to, and a record cut short at the end of a
+# file, by a crash part way through a write, is ignored.
+FILE_MAGIC = b"C4GAMES\0"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<8sI")
+RECORD_HEADER = struct.Struct("<BBBbH")
+
+# Columns have to fit in 4 bits
+MAX_RECORD_WIDTH = 16
+
+DEFAULT_BUFFER_SIZE = 2 ** 16
+
+# One recorded game
+GameRecord = namedtuple("GameRecord", ["width", "height", "starting_player", "winner", "moves"])
+
+
+def pack_record(width, height, starting_player, winner, moves):
+    if width > MAX_RECORD_WIDTH or height > 255:
+        raise ValueError("Board is too big to record.")
+
+    n_moves = len(moves)
+    moves = list(moves) + [0] * (n_moves % 2)
+    packed = bytes(low | (high << 4) for low, high in zip(moves[::2], moves[1::2]))
+    return RECORD_HEADER.pack(width, height, starting_player, winner, n_moves) + packed
+
+
+def replay(record, board_class=Board):
+    # A board with every move of the game played
+    board = board_class(record.width, record.height, record.starting_player)
+    for move in record.moves:
+        board.play(move)
+    return board
+
+
+class GameWriter:
+    # Appends games to a record file, writing them out in blocks of
+    # buffer_size bytes. Use it as a context manager, or call close(),
+    # so the last block is written.
+    def __init__(self, filename, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.games = 0
+        self._buffer = bytearray()
+
+        self._file = open(filename, "ab")
+        if self._file.tell() == 0:
+            self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+
+
+    def write(self, width, height, starting_player, winner, moves):
+        self._buffer += pack_record(width, height, starting_player, winner, moves)
+        self.games += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+
+    def write_board(self, board, starting_player=PIECE1):
+        # Record the game played on a board, which the board can't tell us
+        # the starting player of
+        self.write(board.get_width(), board.get_height(), starting_player,
+                   board.get_winner(), board.get_move_stack())
+
+
+    def flush(self):
+        self._file.write(self._buffer)
+        self._file.flush()
+        self._buffer = bytearray()
+
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+def read_games(filename):
+    # Generator of every GameRecord in a file, read a block at a time so
+    # files of any size can be streamed
+    with open(filename, "rb", buffering=DEFAULT_BUFFER_SIZE) as file:
+        magic, version = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError("Not a game record file.")
+
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            width, height, starting_player, winner, n_moves = RECORD_HEADER.unpack(header)
+
+            packed = file.read((n_moves + 1) // 2)
+            if len(packed) < (n_moves + 1) // 2:
+                return
+
+            moves = [move for byte in packed for move in (byte & 15, byte >> 4)]
+            yield GameRecord(width, height, starting_player, winner, moves[:n_moves])
+
@@ -0,0 +1,146 @@
+from Board import *
+from BitBoard import BitBoard
+from Agent import MinimaxAgent
+from Evaluation import WindowEvaluator
+from QTable import get_state_key, get_key_words, search_sorted_keys, sort_keys
+import argparse
+import numpy as np
+import struct
+import time
+
+# File layout, all little endian: a header, then the sorted (n, n_words)
+# uint64 state keys, the int8 best move and the float32 score of each state.
+# Keys and moves are those of QTable.get_state_key, so mirrored positions
+# share an entry and moves are in the key's column order.
+FILE_MAGIC = b"C4BOOK\0\0"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<8sIHHBBHHHQ")
+
+DEFAULT_BOOK_PLIES = 4
+DEFAULT_BOOK_DEPTH = 8
+
+
+class OpeningBook:
+    # Best moves for every position in the first few moves of a game,
+    # found ahead of time by a deep search
+    def __init__(self, width, height, keys, moves, scores, starting_player=PIECE1, plies=0, depth=0):
+        self.width, self.height = width, height
+        self.starting_player = starting_player
+        self.plies, self.depth = plies, depth
+        self.n_words = -(-width * (height + 1) // 64)
+
+        keys = np.asarray(keys, dtype=np.uint64).reshape(-1, self.n_words)
+        self._keys, self._moves, self._scores = sort_keys(keys, np.asarray(moves, dtype=np.int8),
+                                                          np.asarray(scores, dtype=np.float32))
+
+
+    def __len__(self):
+        return len(self._keys)
+
+
+    def lookup(self, board):
+        # Book move and score for the position, or None if it isn't in the book
+        if board.get_width() != self.width or board.get_height() != self.height \
+                or board.get_turn_number() >= self.plies:
+            return None
+
+        key, mirrored = get_state_key(board)
+        row = search_sorted_keys(self._keys, get_key_words(key, self.width, self.height))
+        if row < 0:
+            return None
+
+        move = int(self._moves[row])
+        if mirrored:
+            move = self.width - 1 - move
+        return move, float(self._scores[row])
+
+
+    def save(self, filename):
+        with open(filename, "wb") as file:
+            file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, self.width, self.height,
+                                        self.starting_player, 0, self.plies, self.depth,
+                                        self.n_words, len(self._keys)))
+            file.write(self._keys.astype("<u8").tobytes())
+            file.write(self._moves.tobytes())
+            file.write(self._scores.astype("<f4").tobytes())
+
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as file:
+            magic, version, width, height, starting_player, _, plies, depth, n_words, n = \
+                FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+            if magic != FILE_MAGIC or version != FILE_VERSION:
+                raise ValueError("Not an opening book file.")
+            keys = np.fromfile(file, dtype="<u8", count=n * n_words).reshape(n, n_words)
+            moves = np.fromfile(file, dtype=np.int8, count=n)
+            scores = np.fromfile(file, dtype="<f4", count=n)
+        return cls(width, height, keys, moves, scores, starting_player, plies, depth)
+
+
+
+def _search_position(width, height, starting_player, moves, depth):
+    # Deep search of one book position, run in a worker process
+    board = BitBoard(width, height, starting_player)
+    for move in moves:
+        board.play(move)
+    agent = MinimaxAgent(board, depth, tt_size=2 ** 18,
+                         centre_first=True, killer_moves=True, history_heuristic=True,
+                         evaluator=WindowEvaluator(width, height))
+    return agent.search()
+
+
+def build_opening_book(width=DEFAULT_BOARD_WIDTH, height=DEFAULT_BOARD_HEIGHT, starting_player=PIECE1,
+                       plies=DEFAULT_BOOK_PLIES, depth=DEFAULT_BOOK_DEPTH, workers=1):
+    # Search every position reachable in fewer than `plies` moves,
+    # keeping one of each pair of mirror images
+    positions = dict()
+    layer = [[]]
+    for ply in range(plies):
+        next_layer = []
+        for moves in layer:
+            board = BitBoard(width, height, starting_player)
+            for move in moves:
+                board.play(move)
+
+            key, mirrored = get_state_key(board)
+            if key in positions or board.get_winner() != NO_PIECE:
+                continue
+            positions[key] = (moves, mirrored)
+            next_layer += [moves + [move] for move in board.get_valid_moves()]
+        layer = next_layer
+
+    # Only loaded when needed, so looking moves up in a book starts quickly
+    from concurrent.futures import ProcessPoolExecutor
+
+    keys = list(positions)
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(_search_position, *zip(*[(width, height, starting_player, positions[key][0], depth)
+                                                    for key in keys]))
+        results = list(results)
+
+    # Store moves in the column order of the state keys
+    book_moves = [width - 1 - r.move if positions[key][1] else r.move for key, r in zip(keys, results)]
+    scores = [r.score for r in results]
+
+    words = [get_key_words(key, width, height) for key in keys]
+    return OpeningBook(width, height, words, book_moves, scores, starting_player, plies, depth)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book by deep minimax search.")
+    parser.add_argument("output", help="file to write the book to")
+    parser.add_argument("--width", type=int, default=DEFAULT_BOARD_WIDTH)
+    parser.add_argument("--height", type=int, default=DEFAULT_BOARD_HEIGHT)
+    parser.add_argument("--starting-player", type=int, default=PIECE1, choices=[PIECE1, PIECE2])
+    parser.add_argument("--plies", type=int, default=DEFAULT_BOOK_PLIES,
+                        help="book positions with fewer than this many counters played")
+    parser.add_argument("--depth", type=int, default=DEFAULT_BOOK_DEPTH, help="search depth for each position")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    book = build_opening_book(args.width, args.height, args.starting_player, args.plies, args.depth, args.workers)
+    book.save(args.output)
+    print(f"{len(book)} positions in {time.perf_counter() - start_time:.1f}s")
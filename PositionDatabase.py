@@ -0,0 +1,218 @@
+from Board import *
+import argparse
+import numpy as np
+import struct
+import time
+
+# Value of positions which can't be reached in a game, or where the game
+# has already finished
+UNKNOWN = -128
+
+# Largest number of entries in a database, 5x4 and 4x5 boards are well inside
+MAX_DATABASE_SIZE = 2 ** 28
+
+# File layout, all little endian: a header, then the int8 value of every index
+FILE_MAGIC = b"C4RETRO\0"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<8sIHH")
+
+
+class PositionDatabase:
+    # The exact value of every position on a tiny board, found by retrograde
+    # analysis and stored in a dense array so that looking a position up needs
+    # no search at all. Values use the same scores as Solver: 0 is a draw,
+    # positive the player to move wins and negative they lose, further from 0
+    # being a quicker end.
+    #
+    # Each column is encoded as a number with a 1 above the top counter and a
+    # bit per counter below it, set for the second player's counters, which is
+    # one of 2 ** (height + 1) - 1 codes. A position's index is its column codes
+    # (less 1) read as the digits of a number in that base.
+    def __init__(self, width, height, values=None):
+        self.width, self.height = width, height
+        self._cells = width * height
+        self._base = (1 << (height + 1)) - 1
+        self._place_values = self._base ** np.arange(width, dtype=np.int64)
+
+        size = self._base ** width
+        if size > MAX_DATABASE_SIZE:
+            raise ValueError("Board is too big for a position database.")
+
+        if values is None:
+            values = np.full(size, UNKNOWN, dtype=np.int8)
+        self._values = values
+
+        # Number of counters in, and the second player's counters of, each column code
+        codes = np.arange(1 << (height + 1))
+        self._counts = np.zeros(len(codes), dtype=np.int64)
+        self._counts[1:] = np.floor(np.log2(codes[1:])).astype(np.int64)
+        self._colours = (codes & ((1 << self._counts) - 1)).astype(np.uint64)
+
+        # Columns from the centre outwards, for SolverAgent
+        self.column_order = sorted(range(width), key=lambda c: abs(2 * c - (width - 1)))
+
+
+    def __len__(self):
+        return len(self._values)
+
+
+    def reset(self):
+        # Nothing is cached between games
+        pass
+
+
+    def index(self, board):
+        # Position index of the board
+        if (board.get_width(), board.get_height()) != (self.width, self.height):
+            raise ValueError("Board is a different size to the database.")
+
+        # The second player is whoever is to move after an odd number of moves
+        turn = board.get_turn()
+        second = turn if board.get_turn_number() % 2 == 1 else CHANGE_TURN[turn]
+
+        cells = board.get_board()[::-1]
+        counts = np.count_nonzero(cells != NO_PIECE, axis=0)
+        powers = 1 << np.arange(self.height, dtype=np.int64)
+        colours = ((cells == second) * powers[:, None]).sum(axis=0)
+        codes = (1 << counts) | colours
+        return int(((codes - 1) * self._place_values).sum())
+
+
+    def lookup(self, board):
+        # Exact score of the position for the player to move
+        if board.get_winner() != NO_PIECE:
+            raise Warning("The game has finished.")
+        return int(self._values[self.index(board)])
+
+
+    def score_columns(self, board):
+        # Exact score of playing each column, None for columns which are full
+        if board.get_winner() != NO_PIECE:
+            raise Warning("The game has finished.")
+
+        positions = np.array([self.index(board)], dtype=np.int64)
+        moves = board.get_turn_number()
+        bitboards = self._bitboards(positions)
+        scores = []
+        for column in range(self.width):
+            valid, children, wins = self._children(positions, bitboards, moves, column)
+            if not valid[0]:
+                scores.append(None)
+            else:
+                scores.append(int(self._child_scores(children, wins, moves)[0]))
+        return scores
+
+
+    def save(self, filename):
+        with open(filename, "wb") as file:
+            file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, self.width, self.height))
+            file.write(np.ascontiguousarray(self._values).tobytes())
+
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        # With mmap the values are read from the file as they're needed
+        with open(filename, "rb") as file:
+            magic, version, width, height = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError("Not a position database file.")
+
+        size = ((1 << (height + 1)) - 1) ** width
+        if mmap:
+            values = np.memmap(filename, dtype=np.int8, mode="r", offset=FILE_HEADER.size, shape=(size,))
+        else:
+            values = np.fromfile(filename, dtype=np.int8, count=size, offset=FILE_HEADER.size)
+        return cls(width, height, values)
+
+
+    def _bitboards(self, positions):
+        # Bitboards like BitBoard's of all the counters and the second
+        # player's counters, for an array of position indices
+        mask = np.zeros(len(positions), dtype=np.uint64)
+        second = np.zeros(len(positions), dtype=np.uint64)
+        for column in range(self.width):
+            codes = positions // self._place_values[column] % self._base + 1
+            shift = np.uint64(column * (self.height + 1))
+            mask |= ((np.uint64(1) << self._counts[codes].astype(np.uint64)) - np.uint64(1)) << shift
+            second |= self._colours[codes] << shift
+        return mask, second
+
+
+    def _children(self, positions, bitboards, moves, column):
+        # Whether the column can be played in each position, the index of the
+        # positions after playing it (0 if it's full) and whether that move wins
+        counts = self._counts[positions // self._place_values[column] % self._base + 1]
+        valid = counts < self.height
+        piece = moves % 2
+        children = positions + ((1 + piece) << counts) * self._place_values[column]
+        children[~valid] = 0
+
+        mask, second = bitboards
+        mine = second if piece else mask ^ second
+        cell = np.uint64(column * (self.height + 1)) + counts.astype(np.uint64)
+        wins = valid & self._is_win(mine | (np.uint64(1) << cell))
+        return valid, children, wins
+
+
+    def _child_scores(self, children, wins, moves):
+        # Score of each move for the player making it
+        if moves + 1 == self._cells:
+            scores = np.zeros(len(children), dtype=np.int64)
+        else:
+            scores = -self._values[np.where(wins, 0, children)].astype(np.int64)
+        return np.where(wins, (self._cells + 1 - moves) // 2, scores)
+
+
+    def _is_win(self, bits):
+        won = np.zeros(len(bits), dtype=bool)
+        for shift in (1, self.height + 1, self.height, self.height + 2):
+            shift = np.uint64(shift)
+            pairs = bits & (bits >> shift)
+            won |= (pairs & (pairs >> (shift + shift))) != 0
+        return won
+
+
+
+def build_position_database(width, height):
+    # Find every position reachable in a game, a layer per number of moves,
+    # then back up their values from the last layer to the first
+    database = PositionDatabase(width, height)
+    layers = [np.zeros(1, dtype=np.int64)]
+    for moves in range(width * height - 1):
+        positions = layers[-1]
+        bitboards = database._bitboards(positions)
+        next_layer = []
+        for column in range(width):
+            valid, children, wins = database._children(positions, bitboards, moves, column)
+            next_layer.append(children[valid & ~wins])
+        next_layer = np.unique(np.concatenate(next_layer))
+        if len(next_layer) == 0:
+            break
+        layers.append(next_layer)
+
+    values = database._values
+    for moves in reversed(range(len(layers))):
+        positions = layers[moves]
+        bitboards = database._bitboards(positions)
+        best = np.full(len(positions), UNKNOWN, dtype=np.int64)
+        for column in range(width):
+            valid, children, wins = database._children(positions, bitboards, moves, column)
+            scores = database._child_scores(children, wins, moves)
+            best = np.where(valid, np.maximum(best, scores), best)
+        values[positions] = best
+    return database
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve every position of a tiny board by retrograde analysis.")
+    parser.add_argument("output", help="file to write the database to")
+    parser.add_argument("--width", type=int, default=4)
+    parser.add_argument("--height", type=int, default=4)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    database = build_position_database(args.width, args.height)
+    database.save(args.output)
+    print(f"{np.count_nonzero(database._values != UNKNOWN)} positions in {time.perf_counter() - start_time:.1f}s, "
+          f"score of the empty board {database._values[0]}")
@@ -1,7 +1,8 @@
 from Board import *
 from Agent import Agent, RandAgent, MinimaxAgent
+from QTable import QTable, get_state_key
+from GameRecord import read_games
 import numpy as np
-import json
 
 
 class QLearner:
@@ -12,7 +13,8 @@ class QLearner:
                  default_agent = MinimaxAgent,
                  default_reward = 0.0,
                  discount_factor = 0.8,
-                 learning_rate = 0.7):
+                 learning_rate = 0.7,
+                 board_class = Board):
         self.default_reward = default_reward
         self.discount_factor = discount_factor
         self.learning_rate = learning_rate
@@ -21,14 +23,37 @@ class QLearner:
         self.board_height = board_height
 
         self.default_agent = default_agent
+        self.board_class = board_class
+
+        # States are keyed by get_state_key, so moves are stored in the
+        # column order of the canonical (possibly mirrored) position
+        self.Q = QTable(board_width, board_height)
+
+        # Number of updates to each (state, move), and the winner and moves
+        # of each game if they're being recorded, only kept while training
+        # in a worker process
+        self.visits = None
+        self.games = None
 
-        self.Q = dict()
         self.train(training_rounds)
 
-    def train(self, rounds=10):
+    # With workers > 1 the games are spread across processes. Every
+    # sync_every games the workers' tables are merged back into this one by
+    # averaging the values of each (state, move), weighted by how many times
+    # each worker updated it. Passing a seed makes training reproducible.
+    #
+    # Games are recorded with game_writer, a GameRecord.GameWriter, if given.
+    def train(self, rounds=10, workers=1, seed=None, sync_every=100, game_writer=None):
+        if workers > 1:
+            self._train_parallel(rounds, workers, seed, sync_every, game_writer)
+            return
+
+        if seed is not None:
+            np.random.seed(seed)
+
         # Play some random games for training
         for game in range(rounds):
-            board = Board(self.board_width, self.board_height)
+            board = self.board_class(self.board_width, self.board_height)
             agent = QAgent(board, self, exploration=0.8)
 
             # Most games won't have more than 100 turns
@@ -39,17 +64,94 @@ class QLearner:
                     move = agent.get_move()
                     board.play(move)
 
+            if game_writer is not None:
+                game_writer.write_board(board)
+            elif self.games is not None:
+                self.games.append((board.get_winner(), board.get_move_stack()))
+
+
+    # Learn from recorded games without playing them through agents.
+    # records is a game record file name or a list of GameRecords.
+    #
+    # Every move of both players is learnt from, as in train(). Each game
+    # is replayed once to find the rewards, then the updates for a batch of
+    # games are made together, against the values from before the batch:
+    # an update made k times in a batch, to the target t, is the same as
+    # applying old + learning_rate * (t - old) k times in a row.
+    def train_offline(self, records, passes=1, batch_size=1000):
+        if passes > 1 and iter(records) is records:
+            raise ValueError("records can only be read once, pass a file name or a list.")
+
+        for p in range(passes):
+            games = read_games(records) if isinstance(records, str) else records
+            batch, n_games = [], 0
+            for record in games:
+                if (record.width, record.height) != (self.board_width, self.board_height):
+                    raise ValueError("Game is a different size to the learner.")
+                batch += self._replay_game(record)
+                n_games += 1
+                if n_games == batch_size:
+                    self._update_Q_batch(batch)
+                    batch, n_games = [], 0
+            if batch:
+                self._update_Q_batch(batch)
+
+
+    def _replay_game(self, record):
+        # (state, column, reward, valid columns) for every move in the game
+        board = self.board_class(record.width, record.height, record.starting_player)
+        samples = []
+        for move in record.moves:
+            state, mirrored = self.get_state(board)
+            column = self.get_state_column(move, mirrored)
+            valid = [self.get_state_column(m, mirrored) for m in board.get_valid_moves()]
+            samples.append((state, column, self._calculate_reward(board, move), valid))
+            board.play(move)
+        return samples
+
+
+    def _update_Q_batch(self, samples):
+        # Values of each state before the batch, NaN where unknown
+        rows = dict()
+        for state, _, _, _ in samples:
+            rows.setdefault(state, len(rows))
+        values = self.Q.get_many(list(rows)).astype(float)
+
+        n = len(samples)
+        sample_rows = np.array([rows[state] for state, _, _, _ in samples])
+        columns = np.array([column for _, column, _, _ in samples])
+        rewards = np.array([reward for _, _, reward, _ in samples], dtype=float)
+        valid = np.zeros((n, self.board_width), dtype=bool)
+        for i, (_, _, _, valid_columns) in enumerate(samples):
+            valid[i, valid_columns] = True
+
+        # Best known value of each state's valid moves, as _calculate_max_q
+        sample_values = np.where(valid, values[sample_rows], np.nan)
+        known = ~np.all(np.isnan(sample_values), axis=1)
+        max_q = np.full(n, self.default_reward)
+        max_q[known] = np.nanmax(sample_values[known], axis=1)
+
+        # Each (state, column) once, with the number of times it was played
+        pairs, first, counts = np.unique(sample_rows * self.board_width + columns,
+                                         return_index=True, return_counts=True)
+        old = values.ravel()[pairs]
+        old[np.isnan(old)] = self.default_reward
+        target = rewards[first] + self.discount_factor * max_q[first]
+        new = target + (1 - self.learning_rate) ** counts * (old - target)
+
+        states = list(rows)
+        for pair, value in zip(pairs, new):
+            self.Q.set(states[pair // self.board_width], int(pair % self.board_width), float(value))
+
 
     def update_Q(self, board, move):
-        state = self.get_board_hash(board)
+        state, mirrored = self.get_state(board)
+        column = self.get_state_column(move, mirrored)
 
         old_value = self.default_reward
-        if state in self.Q:
-            moves = self.Q[state]
-            if move in moves:
-                old_value = self.Q[state][move]
-        else:
-            self.Q[state] = dict()
+        values = self.Q.get(state)
+        if values is not None and not np.isnan(values[column]):
+            old_value = float(values[column])
         
         reward = self._calculate_reward(board, move)
         max_q = self._calculate_max_q(board)
@@ -58,7 +160,10 @@ class QLearner:
                     (reward + (self.discount_factor * \
                      max_q) - old_value)
 
-        self.Q[state][move] = new_value
+        self.Q.set(state, column, new_value)
+
+        if self.visits is not None:
+            self.visits[(state, column)] = self.visits.get((state, column), 0) + 1
 
 ##        print("self.Q[state]", self.Q[state])
 ##        print("Old value", old_value)
@@ -68,100 +173,154 @@ class QLearner:
 ##        print()
 
 
-    def get_board_hash(self, board):
-        piece = board.get_turn()
-        b = board.get_board()
-        no_pieces = b == NO_PIECE
-        my_pieces = b == piece
-        hash_board = no_pieces + my_pieces*2
+    def _train_parallel(self, rounds, workers, seed, sync_every, game_writer):
+        config = {"board_width": self.board_width,
+                  "board_height": self.board_height,
+                  "default_agent": self.default_agent,
+                  "default_reward": self.default_reward,
+                  "discount_factor": self.discount_factor,
+                  "learning_rate": self.learning_rate,
+                  "board_class": self.board_class}
+        seed_sequence = np.random.SeedSequence(seed)
+
+        # Imported here as most uses of the learner never train in parallel
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as pool:
+            for start in range(0, rounds, sync_every):
+                # Split this block of games between the workers, each with
+                # its own seed derived from the training seed
+                block = min(sync_every, rounds - start)
+                worker_rounds = [block // workers + (w < block % workers) for w in range(workers)]
+                seeds = [int(s.generate_state(1)[0]) for s in seed_sequence.spawn(workers)]
+
+                futures = [pool.submit(_train_worker, config, self.Q, r, s, game_writer is not None)
+                           for r, s in zip(worker_rounds, seeds) if r > 0]
+
+                # Merge in worker order so the result doesn't depend on
+                # which worker finished first
+                totals = dict()
+                for future in futures:
+                    updates, games = future.result()
+                    for winner, moves in games:
+                        game_writer.write(self.board_width, self.board_height, PIECE1, winner, moves)
+                    for (state, column), (value, count) in updates.items():
+                        total = totals.setdefault((state, column), [0.0, 0])
+                        total[0] += value * count
+                        total[1] += count
+
+                for (state, column), (value, count) in totals.items():
+                    self.Q.set(state, column, value / count)
+
 
-        hash_tuple = tuple([tuple(c) for c in hash_board])
+    def get_state(self, board):
+        # Key of the position and whether it is mirrored, see QTable.get_state_key
+        return get_state_key(board)
 
-        hash_value = hash(hash_tuple)
-        return hash_value
+
+    def get_state_column(self, column, mirrored):
+        # Convert between board columns and the columns of a state's values
+        if mirrored:
+            return self.board_width - 1 - column
+        return column
 
 
     def save(self, filename):
-        with open(filename, 'w') as file:
-            json.dump(self.Q, file)
+        # Write the whole table in QTable's binary format
+        self.Q.save(filename, **self._file_header())
 
 
-    def load(self, filename):
-        with open(filename, 'r') as file:
-            d = json.load(file)
-        self.Q = {int(s): {int(m): d[s][m] for m in d[s]} for s in d}
+    def checkpoint(self, filename):
+        # Append only the states changed since the last save or checkpoint
+        self.Q.checkpoint(filename, **self._file_header())
 
-    def _calculate_reward(self, board, move):
-        piece = board.get_turn()
-        board.play(move)
-
-        if board.get_winner() == piece:
-            reward = 10.0
-        elif board.get_winner() == STALEMATE:
-            reward = -1
-        elif board.get_winner() == NO_PIECE:
-            # If there was no winner, set the score to be negative the
-            # best score achievable by the opponent
-            moves = board.get_valid_moves()
-            rewards = [0 for m in moves]
-            for m in range(len(moves)):
-                move = moves[m]
-                
-                board.play(move)
-                winner = board.get_winner()
-                board.undo()
-
-                # If the opponent would win
-                if winner == board.get_turn():
-                    rewards[m] = -100.0
-                else:
-                    rewards[m] = -1.0
-            reward = min(rewards)
-                
-        board.undo()
 
-        return reward
+    def load(self, filename, mmap=True):
+        # With mmap the table is read from the file as it's used, so an agent
+        # which only plays, without learning, starts straight away
+        self.Q, header = QTable.load(filename, mmap)
+        self.board_width, self.board_height = header["width"], header["height"]
+        self.default_reward = header["default_reward"]
+        self.discount_factor = header["discount_factor"]
+        self.learning_rate = header["learning_rate"]
+
+
+    def _file_header(self):
+        return {"default_reward": self.default_reward,
+                "discount_factor": self.discount_factor,
+                "learning_rate": self.learning_rate}
+
+    def _calculate_reward(self, board, move):
+        # Worked out from the board as it is, without playing the move
+        if board.is_winning_move(move):
+            return 10.0
+        if board.get_turn_number() + 1 == board.get_width() * board.get_height():
+            # Stalemate
+            return -1
+        if board.is_losing_move(move):
+            # The opponent would win with their next counter
+            return -100.0
+        return -1.0
 
 
     def _calculate_max_q(self, board):
-        state = self.get_board_hash(board)
-        moves = board.get_valid_moves()
+        state, mirrored = self.get_state(board)
+        values = self.Q.get(state)
+        if values is None:
+            return self.default_reward
+
+        columns = [self.get_state_column(m, mirrored) for m in board.get_valid_moves()]
+        rewards = values[columns]
+        rewards = rewards[~np.isnan(rewards)]
+        if len(rewards) == 0:
+            return self.default_reward
+        return float(rewards.max())
+
+
 
-        best_reward = -1000
-        for move in moves:
-            if state in self.Q:
-                if move in self.Q[state]:
-                    reward = self.Q[state][move]
-                    best_reward = max(reward, best_reward)
-        if best_reward == -1000:
-            best_reward = self.default_reward
-        return best_reward
+def _train_worker(config, Q, rounds, seed, record_games):
+    # Train a copy of the table in a worker process and return the new value
+    # and number of updates of every (state, move) it changed, and the
+    # games played if they're being recorded
+    learner = QLearner(training_rounds=0, **config)
+    learner.Q = Q
+    learner.visits = dict()
+    learner.games = [] if record_games else None
+    learner.train(rounds, seed=seed)
+    updates = {(state, column): (float(learner.Q.get(state)[column]), count)
+               for (state, column), count in learner.visits.items()}
+    return updates, learner.games or []
 
 
 
 class QAgent(Agent):
-    def __init__(self, board, qlearner, exploration=0):
+    # Unless exploring, moves in the opening book are played before
+    # looking at the Q table
+    def __init__(self, board, qlearner, exploration=0, opening_book=None):
         super().__init__(board)
         self.qlearner = qlearner
         self.exploration = exploration
+        self.opening_book = opening_book
 
 
     def get_move(self, dolearning=True):
-        state = self.qlearner.get_board_hash(self.board)
+        state, mirrored = self.qlearner.get_state(self.board)
 
         do_random = False
         do_default = False
 
-        if np.random.uniform(0, 1) >= self.exploration:
-            if state in self.qlearner.Q:
-                move_reward_dict = self.qlearner.Q[state]
-
-                if len(move_reward_dict) > 0:
-                    moves = list(move_reward_dict.keys())
-                    rewards = list(move_reward_dict.values())
+        book_entry = None
+        if self.opening_book is not None:
+            book_entry = self.opening_book.lookup(self.board)
 
-                    best_ix = np.argmax(rewards)
-                    move = moves[best_ix]
+        if np.random.uniform(0, 1) >= self.exploration:
+            rewards = self.qlearner.Q.get(state)
+            if book_entry is not None:
+                move = book_entry[0]
+            elif rewards is not None:
+                if not np.all(np.isnan(rewards)):
+                    best_ix = int(np.nanargmax(rewards))
+                    move = self.qlearner.get_state_column(best_ix, mirrored)
                 else:
                     do_default = True
             else:
@@ -188,13 +347,12 @@ if __name__ == "__main__":
     qlearner = QLearner(board_width=w, board_height=h, training_rounds=0)
 
     try:
-        qlearner.load("dict.json")
+        qlearner.load("qtable.bin")
     except:
         pass
 
     qlearner.train(rounds=100)
     print(len(qlearner.Q))
-    print(len(str(qlearner.Q)))
 
     board = Board(w, h)
     agent1 = QAgent(board, qlearner)
@@ -220,6 +378,5 @@ if __name__ == "__main__":
             break
 
     print(len(qlearner.Q))
-    print(len(str(qlearner.Q)))
 
-    qlearner.save("dict.json")
+    qlearner.save("qtable.bin")
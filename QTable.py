@@ -0,0 +1,446 @@
+from Board import *
+from BitBoard import BitBoard
+import numpy as np
+import os
+import struct
+
+_MASK64 = (1 << 64) - 1
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+MIN_CAPACITY = 16
+MAX_LOAD = 0.5
+
+# Binary file layout, all little endian:
+#   file header     - magic, version, width, height, key words per state and
+#                     the learner's default reward, discount factor and learning rate
+#   segment, ...    - segment header with the number of states, then the sorted
+#                     (n, n_words) uint64 keys and the (n, width) float32 values,
+#                     padded to a multiple of 8 bytes
+# The first segment holds the whole table when it was saved, later ones are
+# checkpoints holding only the states changed since, which take precedence.
+FILE_MAGIC = b"C4QTABLE"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<8sIHHH2xddd20x")
+SEGMENT_MAGIC = b"QSEG"
+SEGMENT_HEADER = struct.Struct("<4s4xQ")
+
+
+def get_state_key(board):
+    # Exact integer key for a position, from the point of view of the player
+    # to move, canonicalised under left-right reflection.
+    #
+    # Each column is (height + 1) bits: a bit per counter, set for the player
+    # to move, with a 1 above the top counter to mark the column's height.
+    # Returns the key and whether it belongs to the mirror image, in which
+    # case column c of the board is column (width - 1 - c) of the key.
+    height = board.get_height()
+    if isinstance(board, BitBoard):
+        # The bitboards already hold each column's code: a column's counters
+        # plus one is its height marker
+        current, mask = board.get_bitboards()
+        column_mask = (1 << height) - 1
+        codes = [((current >> shift) & column_mask) + ((mask >> shift) & column_mask) + 1
+                 for shift in range(0, board.get_width() * (height + 1), height + 1)]
+    else:
+        cells = board.get_board()[::-1]
+        filled = cells != NO_PIECE
+        mine = filled & (cells == board.get_turn())
+
+        powers = 1 << np.arange(height, dtype=np.int64)
+        codes = (powers @ mine + (1 << np.count_nonzero(filled, axis=0))).tolist()
+
+    key, mirror_key = 0, 0
+    for code in codes:
+        key = (key << (height + 1)) | code
+    for code in reversed(codes):
+        mirror_key = (mirror_key << (height + 1)) | code
+
+    if mirror_key < key:
+        return mirror_key, True
+    return key, False
+
+
+def get_key_words(key, width, height):
+    # Split a state key into 64 bit words, most significant first. Keys are
+    # left aligned in their words, so comparing rows of words compares keys.
+    n_words = -(-width * (height + 1) // 64)
+    key <<= 64 * n_words - width * (height + 1)
+    return [(key >> (64 * i)) & _MASK64 for i in reversed(range(n_words))]
+
+
+def search_sorted_keys(keys, words):
+    # Row of the key in a sorted (n, n_words) array of keys, or -1 if missing
+    if len(keys) == 0:
+        return -1
+    row = int(np.searchsorted(keys[:, 0], np.uint64(words[0])))
+    while row < len(keys) and keys[row, 0] == words[0]:
+        if keys[row].tolist() == words:
+            return row
+        row += 1
+    return -1
+
+
+def sort_keys(keys, *arrays):
+    # Sort rows of keys, and arrays of the same length alongside them
+    order = np.lexsort(keys.T[::-1])
+    return (keys[order],) + tuple(a[order] for a in arrays)
+
+
+class QTable:
+    # Array backed table of Q values. Every state gets a row in a dense
+    # (n_states, width) float32 matrix, NaN marking moves with no value yet.
+    # State keys are stored alongside as rows of 64 bit words, and an open
+    # addressing hash index maps keys to rows.
+    def __init__(self, width=DEFAULT_BOARD_WIDTH, height=DEFAULT_BOARD_HEIGHT, capacity=MIN_CAPACITY):
+        self.width, self.height = width, height
+
+        key_bits = width * (height + 1)
+        self.n_words = -(-key_bits // 64)
+        self._key_shift = 64 * self.n_words - key_bits
+
+        self._n_states = 0
+        self._keys = np.zeros((capacity, self.n_words), dtype=np.uint64)
+        self._values = np.full((capacity, width), np.nan, dtype=np.float32)
+
+        # Rows changed since the table was last written to a file
+        self._dirty = np.zeros(capacity, dtype=bool)
+
+        self._index = None
+        self._resize_index(max(MIN_CAPACITY, 1 << int(np.ceil(np.log2(capacity / MAX_LOAD)))))
+
+        # Read only states from a file, usually memory mapped, which are
+        # copied into the table above when they change
+        self._base_keys = np.zeros((0, self.n_words), dtype=np.uint64)
+        self._base_values = np.zeros((0, width), dtype=np.float32)
+        self._n_shadowed = 0
+
+
+    def __len__(self):
+        return self._n_states + len(self._base_keys) - self._n_shadowed
+
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+    def get_keys(self):
+        # (n_states, n_words) array of the keys held in memory
+        return self._keys[:self._n_states]
+
+
+    def get_values(self):
+        # (n_states, width) matrix of the values held in memory, one row per key
+        return self._values[:self._n_states]
+
+
+    def get(self, key):
+        # Values of every move for the key, or None if it isn't in the table.
+        # Values from a memory mapped file are read only, use set() to change them.
+        row = self.lookup(key)
+        if row >= 0:
+            return self._values[row]
+
+        base_row = self._base_lookup(self.key_words(key))
+        if base_row >= 0:
+            return self._base_values[base_row]
+        return None
+
+
+    def get_many(self, keys):
+        # (n, width) matrix of the values of a list of keys, a row of NaNs
+        # for each key which isn't in the table
+        words = np.array([self.key_words(key) for key in keys], dtype=np.uint64).reshape(-1, self.n_words)
+        values = np.full((len(words), self.width), np.nan, dtype=np.float32)
+
+        rows = self.lookup_many(words)
+        found = rows >= 0
+        values[found] = self._values[rows[found]]
+
+        missing = np.flatnonzero(~found)
+        base_rows = self._base_lookup_many(words[missing])
+        in_base = base_rows >= 0
+        values[missing[in_base]] = self._base_values[base_rows[in_base]]
+        return values
+
+
+    def set(self, key, column, value):
+        row = self.insert(key)
+        self._values[row, column] = value
+        self._dirty[row] = True
+
+
+    def key_words(self, key):
+        return get_key_words(key, self.width, self.height)
+
+
+    def words_key(self, words):
+        key = 0
+        for word in words:
+            key = (key << 64) | int(word)
+        return key >> self._key_shift
+
+
+    def lookup(self, key):
+        # Row of the key, or -1 if it isn't in the table
+        words = self.key_words(key)
+        slot = self._hash(words)
+        index, keys, mask = self._index, self._keys, len(self._index) - 1
+        while True:
+            row = index[slot]
+            if row < 0:
+                return -1
+            if keys[row].tolist() == words:
+                return int(row)
+            slot = (slot + 1) & mask
+
+
+    def insert(self, key):
+        # Row of the key, adding a row of NaNs if it isn't in the table
+        row = self.lookup(key)
+        if row >= 0:
+            return row
+
+        if self._n_states == len(self._keys):
+            self._grow_rows(2 * len(self._keys))
+        row = self._n_states
+        words = self.key_words(key)
+        self._keys[row] = words
+        self._n_states += 1
+
+        # Start from the values in the file, if there are any
+        base_row = self._base_lookup(words)
+        if base_row >= 0:
+            self._values[row] = self._base_values[base_row]
+            self._n_shadowed += 1
+
+        if self._n_states > MAX_LOAD * len(self._index):
+            self._resize_index(2 * len(self._index))
+        else:
+            slot = self._hash(words)
+            mask = len(self._index) - 1
+            while self._index[slot] >= 0:
+                slot = (slot + 1) & mask
+            self._index[slot] = row
+        return row
+
+
+    def lookup_many(self, keys):
+        # Rows for a (n, n_words) array of keys, -1 where missing
+        keys = np.asarray(keys, dtype=np.uint64).reshape(-1, self.n_words)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        mask = np.uint64(len(self._index) - 1)
+        slots = self._hash_many(keys)
+        pending = np.arange(len(keys))
+
+        # Probe every key in step until it hits itself or an empty slot
+        while len(pending) > 0:
+            found = self._index[slots]
+            empty = found < 0
+            match = ~empty
+            match[match] = np.all(self._keys[found[match]] == keys[pending[match]], axis=1)
+            rows[pending[match]] = found[match]
+
+            probing = ~(empty | match)
+            pending, slots = pending[probing], (slots[probing] + np.uint64(1)) & mask
+        return rows
+
+
+    def save(self, filename, default_reward=0.0, discount_factor=0.0, learning_rate=0.0):
+        # Write the whole table as a single sorted segment. The file is written
+        # beside the old one and then renamed, so readers never see half a file.
+        keys, values = self._merged()
+        temporary = filename + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, self.width, self.height, self.n_words,
+                                        default_reward, discount_factor, learning_rate))
+            self._write_segment(file, keys, values)
+
+        # Windows won't replace a file while it's memory mapped, so states
+        # mapped from the file being saved over are read into memory first
+        if isinstance(self._base_keys, np.memmap) and os.path.exists(filename) \
+                and os.path.samefile(self._base_keys.filename, filename):
+            self._base_keys = np.array(self._base_keys)
+            self._base_values = np.array(self._base_values)
+        os.replace(temporary, filename)
+        self._dirty[:] = False
+
+
+    def checkpoint(self, filename, **header):
+        # Append the states changed since the last save or checkpoint
+        # to the end of an existing file
+        if not os.path.exists(filename):
+            self.save(filename, **header)
+            return
+
+        with open(filename, "rb") as file:
+            self._check_header(read_header(file))
+
+        rows = np.flatnonzero(self._dirty[:self._n_states])
+        if len(rows) == 0:
+            return
+        keys, values = sort_keys(self._keys[rows], self._values[rows])
+        with open(filename, "ab") as file:
+            self._write_segment(file, keys, values)
+        self._dirty[:] = False
+
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        # Open a table saved with save(). With mmap the saved states are read
+        # from the file as they're needed, and their pages are shared between
+        # processes using the same file. Returns the table and the file header.
+        with open(filename, "rb") as file:
+            header = read_header(file)
+            segments = []
+            offset = FILE_HEADER.size
+            file_size = os.fstat(file.fileno()).st_size
+            while offset + SEGMENT_HEADER.size <= file_size:
+                file.seek(offset)
+                magic, n = SEGMENT_HEADER.unpack(file.read(SEGMENT_HEADER.size))
+                size = _segment_size(n, header["n_words"], header["width"])
+                # Ignore a checkpoint that was only partly written
+                if magic != SEGMENT_MAGIC or offset + size > file_size:
+                    break
+                segments.append((offset + SEGMENT_HEADER.size, n))
+                offset += size
+
+        table = cls(header["width"], header["height"])
+        for i, (offset, n) in enumerate(segments):
+            keys, values = table._read_segment(filename, offset, n, mmap and i == 0)
+            if i == 0:
+                table._base_keys, table._base_values = keys, values
+            else:
+                for words, row_values in zip(keys, values):
+                    row = table.insert(table.words_key(words))
+                    table._values[row] = row_values
+
+        table._dirty[:] = False
+        return table, header
+
+
+    def _check_header(self, header):
+        if (header["width"], header["height"]) != (self.width, self.height):
+            raise ValueError("File is for a different board size.")
+
+
+    def _merged(self):
+        # Every state, from memory and the file, sorted by key
+        keys = self._keys[:self._n_states]
+        values = self._values[:self._n_states]
+        if len(self._base_keys) > 0:
+            # States in memory replace their copies from the file
+            in_memory = self._base_lookup_many(keys)
+            keep = np.ones(len(self._base_keys), dtype=bool)
+            keep[in_memory[in_memory >= 0]] = False
+            keys = np.concatenate([self._base_keys[keep], keys])
+            values = np.concatenate([self._base_values[keep], values])
+        return sort_keys(keys, values)
+
+
+    def _write_segment(self, file, keys, values):
+        file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(keys)))
+        file.write(np.ascontiguousarray(keys, dtype="<u8").tobytes())
+        file.write(np.ascontiguousarray(values, dtype="<f4").tobytes())
+        padding = -(len(keys) * self.width * 4) % 8
+        file.write(b"\0" * padding)
+
+
+    def _read_segment(self, filename, offset, n, mmap):
+        values_offset = offset + n * self.n_words * 8
+        if n == 0:
+            return np.zeros((0, self.n_words), dtype=np.uint64), np.zeros((0, self.width), dtype=np.float32)
+        if mmap:
+            keys = np.memmap(filename, dtype="<u8", mode="r", offset=offset, shape=(n, self.n_words))
+            values = np.memmap(filename, dtype="<f4", mode="r", offset=values_offset, shape=(n, self.width))
+        else:
+            with open(filename, "rb") as file:
+                file.seek(offset)
+                keys = np.fromfile(file, dtype="<u8", count=n * self.n_words).reshape(n, self.n_words)
+                values = np.fromfile(file, dtype="<f4", count=n * self.width).reshape(n, self.width)
+        return keys, values
+
+
+    def _base_lookup(self, words):
+        # Binary search of the sorted keys from the file, -1 if missing
+        return search_sorted_keys(self._base_keys, words)
+
+
+    def _base_lookup_many(self, keys):
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._base_keys) == 0 or len(keys) == 0:
+            return rows
+        first = np.searchsorted(self._base_keys[:, 0], keys[:, 0])
+        candidates = np.minimum(first, len(self._base_keys) - 1)
+        match = np.all(self._base_keys[candidates] == keys, axis=1)
+        rows[match] = candidates[match]
+
+        # Keys whose first word is shared by several states are rare,
+        # search for those one at a time
+        tied = np.flatnonzero(~match & (self._base_keys[candidates, 0] == keys[:, 0]))
+        for i in tied:
+            rows[i] = self._base_lookup(keys[i].tolist())
+        return rows
+
+
+    def _hash(self, words):
+        h = 0
+        for word in words:
+            h = ((h ^ word) * _HASH_MULTIPLIER) & _MASK64
+        return h >> self._hash_shift
+
+
+    def _hash_many(self, keys):
+        h = np.zeros(len(keys), dtype=np.uint64)
+        for i in range(self.n_words):
+            h = (h ^ keys[:, i]) * np.uint64(_HASH_MULTIPLIER)
+        return h >> np.uint64(self._hash_shift)
+
+
+    def _grow_rows(self, capacity):
+        keys = np.zeros((capacity, self.n_words), dtype=np.uint64)
+        values = np.full((capacity, self.width), np.nan, dtype=np.float32)
+        dirty = np.zeros(capacity, dtype=bool)
+        keys[:self._n_states] = self._keys[:self._n_states]
+        values[:self._n_states] = self._values[:self._n_states]
+        dirty[:self._n_states] = self._dirty[:self._n_states]
+        self._keys, self._values, self._dirty = keys, values, dirty
+
+
+    def _resize_index(self, size):
+        self._index = np.full(size, -1, dtype=np.int32)
+        self._hash_shift = 64 - (size.bit_length() - 1)
+        self._index_rows(np.arange(self._n_states))
+
+
+    def _index_rows(self, rows):
+        # Add rows to the hash index using linear probing
+        mask = np.uint64(len(self._index) - 1)
+        slots = self._hash_many(self._keys[rows])
+        while len(rows) > 0:
+            # Each empty slot goes to the first row that wants it,
+            # everything else moves on to the next slot
+            free = self._index[slots] < 0
+            _, first = np.unique(slots, return_index=True)
+            placed = np.zeros(len(rows), dtype=bool)
+            placed[first] = True
+            placed &= free
+            self._index[slots[placed]] = rows[placed]
+
+            rows, slots = rows[~placed], (slots[~placed] + np.uint64(1)) & mask
+
+
+
+def read_header(file):
+    magic, version, width, height, n_words, default_reward, discount_factor, learning_rate = \
+        FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+    if magic != FILE_MAGIC or version != FILE_VERSION:
+        raise ValueError("Not a Q table file.")
+    return {"width": width, "height": height, "n_words": n_words,
+            "default_reward": default_reward,
+            "discount_factor": discount_factor,
+            "learning_rate": learning_rate}
+
+
+def _segment_size(n, n_words, width):
+    values_size = n * width * 4
+    return SEGMENT_HEADER.size + n * n_words * 8 + values_size + (-values_size % 8)
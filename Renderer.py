@@ -0,0 +1,95 @@
+import pygame
+import numpy as np
+from Board import *
+
+
+class BoardRenderer:
+    # Draws a board into a rect of a surface, redrawing only what changed
+    # since the last call. The counters and empty slots are drawn once onto
+    # their own surfaces and blitted from then on.
+    def __init__(self, board_width, board_height, rect, back_colour, empty_colour,
+                 counter1_colour, counter2_colour, highlight_colour, stalemate_colour):
+        self.rect = pygame.Rect(rect)
+        self.board_width, self.board_height = board_width, board_height
+        self.back_colour = back_colour
+        self.highlight_colour = highlight_colour
+        self.outline_colours = {PIECE1: counter1_colour, PIECE2: counter2_colour, STALEMATE: stalemate_colour}
+
+        x, y, width, height = self.rect
+        self.diameter = int(min(width / board_width, height / board_height))
+        self._x_coords = [x + int((i / board_width) * width) for i in range(board_width)]
+        self._y_coords = [y + int((j / board_height) * height) for j in range(board_height)]
+
+        # One surface per cell value
+        self._sprites = dict()
+        for piece, colour in [(NO_PIECE, empty_colour), (PIECE1, counter1_colour), (PIECE2, counter2_colour)]:
+            sprite = pygame.Surface((self.diameter, self.diameter))
+            sprite.fill(back_colour)
+            pygame.draw.circle(sprite, colour, (self.diameter // 2, self.diameter // 2), self.diameter // 2)
+            self._sprites[piece] = sprite
+
+        self.invalidate()
+
+
+    def invalidate(self):
+        # Redraw everything on the next call to draw()
+        self._drawn_cells = None
+        self._drawn_moves = None
+        self._drawn_column = -1
+        self._drawn_winner = NO_PIECE
+
+
+    def column_rects(self):
+        # A rect for each column, for picking the column under the mouse
+        return [pygame.Rect(x, self.rect.y, self.diameter, self.rect.height) for x in self._x_coords]
+
+
+    def draw(self, surface, board, selected_column=-1):
+        # Bring the drawing up to date. Returns the list of rects which
+        # changed, for pygame.display.update.
+        moves = board.get_move_stack()
+        if self._drawn_cells is not None and moves == self._drawn_moves \
+                and selected_column == self._drawn_column:
+            return []
+
+        cells = board.get_board()
+        winner = board.get_winner()
+        if self._drawn_cells is None or winner != self._drawn_winner:
+            # Start again from the background
+            pygame.draw.rect(surface, self.back_colour, self.rect)
+            for column in range(self.board_width):
+                self._draw_column(surface, cells, column)
+            if winner != NO_PIECE:
+                outline_width = min(self.rect.width, self.rect.height) // 64
+                pygame.draw.rect(surface, self.outline_colours[winner], self.rect, outline_width)
+            dirty = [self.rect.copy()]
+        else:
+            dirty = [self._blit_cell(surface, cells, row, column)
+                     for row, column in np.argwhere(cells != self._drawn_cells)]
+
+            # Move the highlight, redrawing the column it leaves
+            if selected_column != self._drawn_column and self._drawn_column != -1:
+                dirty.append(self._draw_column(surface, cells, self._drawn_column))
+
+        if selected_column != -1:
+            rect = self.column_rects()[selected_column]
+            pygame.draw.rect(surface, self.highlight_colour, rect, 4)
+            dirty.append(rect)
+
+        self._drawn_cells = cells.copy()
+        self._drawn_moves = moves
+        self._drawn_column = selected_column
+        self._drawn_winner = winner
+        return dirty
+
+
+    def _draw_column(self, surface, cells, column):
+        rect = self.column_rects()[column]
+        pygame.draw.rect(surface, self.back_colour, rect)
+        for row in range(self.board_height):
+            self._blit_cell(surface, cells, row, column)
+        return rect
+
+
+    def _blit_cell(self, surface, cells, row, column):
+        return surface.blit(self._sprites[cells[row, column]], (self._x_coords[column], self._y_coords[row]))
@@ -0,0 +1,247 @@
+from Board import *
+from BitBoard import get_winning_cells
+from Agent import Agent
+import time
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+DEFAULT_SOLVER_TT_SIZE = 2 ** 22
+
+
+class Solver:
+    # Exact Connect 4 solver: a negamax search over bitboards with alpha-beta
+    # pruning, a transposition table and null window probes narrowing down
+    # the score.
+    #
+    # Scores are from the point of view of the player to move. 0 is a draw,
+    # a positive score is a win and a negative score a loss, and the further
+    # from 0 the sooner the game ends: the winner wins with their
+    # ((width * height + 2) // 2 - abs(score))th counter.
+    #
+    # The bitboards use (height + 1) bits per column like BitBoard, with
+    # `current` holding the counters of the player to move and `mask` all
+    # the counters.
+    def __init__(self, width=DEFAULT_BOARD_WIDTH, height=DEFAULT_BOARD_HEIGHT, tt_size=DEFAULT_SOLVER_TT_SIZE):
+        self.width, self.height = width, height
+        self.tt_size = tt_size
+        self.nodes = 0
+
+        self._cells = width * height
+        self._bottom = sum(1 << (c * (height + 1)) for c in range(width))
+        self._board_mask = self._bottom * ((1 << height) - 1)
+        self._column_masks = [((1 << height) - 1) << (c * (height + 1)) for c in range(width)]
+
+        # Columns from the centre outwards
+        self.column_order = sorted(range(width), key=lambda c: abs(2 * c - (width - 1)))
+
+        # Upper bounds of scores, keyed on current + mask
+        self._table = dict()
+
+
+    def reset(self):
+        self._table = dict()
+        self.nodes = 0
+
+
+    def solve(self, board):
+        # Exact score of the position for the player to move
+        current, mask, moves = self._from_board(board)
+        return self._solve(current, mask, moves)
+
+
+    def score_columns(self, board):
+        # Exact score of playing each column, None for columns which are full
+        current, mask, moves = self._from_board(board)
+        scores = []
+        for column in range(self.width):
+            move = (mask + (1 << (column * (self.height + 1)))) & self._column_masks[column]
+            if move == 0:
+                scores.append(None)
+            elif self._is_winning_move(current, mask, move):
+                scores.append((self._cells + 1 - moves) // 2)
+            elif moves + 1 == self._cells:
+                scores.append(0)
+            else:
+                scores.append(-self._solve(current ^ mask, mask | move, moves + 1))
+        return scores
+
+
+    def describe(self, board, score):
+        # Result for the player to move and the number of moves left in the
+        # game with perfect play from both players
+        if score == 0:
+            return DRAW, self._cells - board.get_turn_number()
+
+        moves = board.get_turn_number()
+        counter = (self._cells + 2) // 2 - abs(score)
+        if score > 0:
+            return WIN, 2 * (counter - moves // 2) - 1
+        return LOSS, 2 * (counter - (moves - moves // 2))
+
+
+    def _from_board(self, board):
+        if board.get_winner() != NO_PIECE:
+            raise Warning("The game has finished.")
+        if (board.get_width(), board.get_height()) != (self.width, self.height):
+            raise ValueError("Board is a different size to the solver.")
+
+        cells = board.get_board()
+        turn = board.get_turn()
+        current, mask = 0, 0
+        for column in range(self.width):
+            for row in range(self.height):
+                piece = cells[self.height - 1 - row, column]
+                if piece != NO_PIECE:
+                    bit = 1 << (column * (self.height + 1) + row)
+                    mask |= bit
+                    if piece == turn:
+                        current |= bit
+        return current, mask, board.get_turn_number()
+
+
+    def _solve(self, current, mask, moves):
+        if self._winning_cells(current, mask) & self._possible(mask):
+            return (self._cells + 1 - moves) // 2
+
+        # Binary search on the score with null window searches
+        low = -((self._cells - moves) // 2)
+        high = (self._cells + 1 - moves) // 2
+        while low < high:
+            middle = low + (high - low) // 2
+            if middle <= 0 and int(low / 2) < middle:
+                middle = int(low / 2)
+            elif middle >= 0 and int(high / 2) > middle:
+                middle = int(high / 2)
+
+            score = self._negamax(current, mask, moves, middle, middle + 1)
+            if score <= middle:
+                high = score
+            else:
+                low = score
+        return low
+
+
+    def _negamax(self, current, mask, moves, alpha, beta):
+        # Assumes the player to move can't win straight away
+        self.nodes += 1
+        cells = self._cells
+
+        possible = self._non_losing_moves(current, mask)
+        if possible == 0:
+            return -((cells - moves) // 2)
+        if moves >= cells - 2:
+            return 0
+
+        # The opponent can't win with their next counter
+        low = -((cells - 2 - moves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+
+        # We can't win with our next counter
+        high = (cells - 1 - moves) // 2
+        key = current + mask
+        bound = self._table.get(key)
+        if bound is not None:
+            high = bound
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # Try moves which make the most new threats first,
+        # breaking ties from the centre outwards
+        candidates = []
+        for column in self.column_order:
+            move = possible & self._column_masks[column]
+            if move:
+                threats = self._count_bits(self._winning_cells(current | move, mask))
+                candidates.append((threats, move))
+        candidates.sort(key=lambda c: -c[0])
+
+        for _, move in candidates:
+            score = -self._negamax(current ^ mask, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        if len(self._table) >= self.tt_size:
+            self._table.clear()
+        self._table[key] = alpha
+        return alpha
+
+
+    def _possible(self, mask):
+        return (mask + self._bottom) & self._board_mask
+
+
+    def _non_losing_moves(self, current, mask):
+        possible = self._possible(mask)
+        opponent_wins = self._winning_cells(current ^ mask, mask)
+
+        # A move has to block the opponent's winning cell, if there is one
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                return 0
+            possible = forced
+
+        # Don't play directly below a cell where the opponent wins
+        return possible & ~(opponent_wins >> 1)
+
+
+    def _is_winning_move(self, current, mask, move):
+        return bool(self._winning_cells(current, mask) & move)
+
+
+    def _winning_cells(self, position, mask):
+        # Empty cells which would complete four in a row for `position`
+        return get_winning_cells(position, self._board_mask ^ mask, self.height)
+
+
+    def _count_bits(self, bits):
+        return bin(bits).count("1")
+
+
+
+class SolverAgent(Agent):
+    # Plays perfectly: the quickest win, otherwise a draw,
+    # otherwise the slowest loss. The solver can also be a PositionDatabase.
+    def __init__(self, board, solver=None):
+        super().__init__(board)
+        if solver is None:
+            solver = Solver(board.get_width(), board.get_height())
+        self.solver = solver
+
+
+    def new_game(self, board=None):
+        if board is not None:
+            self.board = board
+        self.solver.reset()
+
+
+    def get_move(self):
+        scores = self.solver.score_columns(self.board)
+        best_move, best_score = None, None
+        for column in self.solver.column_order:
+            if scores[column] is not None and (best_score is None or scores[column] > best_score):
+                best_move, best_score = column, scores[column]
+        return best_move
+
+
+
+if __name__ == "__main__":
+    # Solve a 6x6 position and print the score of every column
+    board = Board(6, 6)
+    for move in [2, 3, 3, 2, 4, 3, 1, 2]:
+        board.play(move)
+    print(board.get_board())
+
+    solver = Solver(6, 6)
+    start_time = time.perf_counter()
+    scores = solver.score_columns(board)
+    print(f"Scores {scores} in {time.perf_counter() - start_time:.2f}s, {solver.nodes} nodes")
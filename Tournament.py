@@ -0,0 +1,220 @@
+from Board import *
+from BitBoard import BitBoard
+from Agent import RandAgent, MinimaxAgent
+from Evaluation import WindowEvaluator
+from QLearning import QLearner, QAgent
+from Solver import SolverAgent
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import itertools
+import json
+import numpy as np
+import time
+
+# Agents are given as strings so they can be sent to worker processes:
+#   random            - RandAgent
+#   minimax:<depth>   - MinimaxAgent set up as in Game.py
+#   q:<file>          - QAgent playing from a saved Q table, without learning
+#   solver            - SolverAgent, only for small boards
+ELO_SCALE = 400 / np.log(10)
+
+# Virtual draws between every pair of agents, which keeps the rating of an
+# agent that won or lost every game finite
+PRIOR_DRAWS = 1
+
+# Q tables loaded by this worker process, by file name
+_learners = dict()
+
+
+def make_agent(spec, board):
+    kind, _, argument = spec.partition(":")
+    if kind == "random":
+        return RandAgent(board)
+    if kind == "minimax":
+        return MinimaxAgent(board, int(argument), tt_size=2 ** 16,
+                            centre_first=True, killer_moves=True, history_heuristic=True,
+                            evaluator=WindowEvaluator(board.get_width(), board.get_height()))
+    if kind == "q":
+        if argument not in _learners:
+            learner = QLearner(training_rounds=0)
+            learner.load(argument)
+            _learners[argument] = learner
+        learner = _learners[argument]
+        if (learner.board_width, learner.board_height) != (board.get_width(), board.get_height()):
+            raise ValueError(f"{spec} is for a {learner.board_width}x{learner.board_height} board, "
+                             f"not {board.get_width()}x{board.get_height()}.")
+        return QAgent(board, learner)
+    if kind == "solver":
+        return SolverAgent(board)
+    raise ValueError(f"Unknown agent {spec}.")
+
+
+def play_game(game, players, width, height, seed):
+    # Play one game, players[0] moving first. Returns a result for the
+    # results file, with the score of the first player.
+    np.random.seed(seed)
+    board = BitBoard(width, height, PIECE1)
+    agents = {PIECE1: make_agent(players[0], board), PIECE2: make_agent(players[1], board)}
+    times = {PIECE1: 0.0, PIECE2: 0.0}
+    move_counts = {PIECE1: 0, PIECE2: 0}
+
+    while board.get_winner() == NO_PIECE:
+        turn = board.get_turn()
+        agent = agents[turn]
+        start_time = time.perf_counter()
+        if isinstance(agent, QAgent):
+            move = agent.get_move(dolearning=False)
+        else:
+            move = agent.get_move()
+        times[turn] += time.perf_counter() - start_time
+        move_counts[turn] += 1
+        board.play(int(move))
+
+    score = {PIECE1: 1.0, PIECE2: 0.0, STALEMATE: 0.5}[board.get_winner()]
+    return {"game": game,
+            "players": list(players),
+            "width": width,
+            "height": height,
+            "score": score,
+            "moves": board.get_move_stack(),
+            "times": [times[PIECE1], times[PIECE2]],
+            "move_counts": [move_counts[PIECE1], move_counts[PIECE2]]}
+
+
+def schedule(agents, mode="round-robin", games=10, sizes=((7, 6),), seed=None):
+    # (game, players, width, height, seed) for every game. Each pairing
+    # plays `games` games on every board size, taking turns to move first.
+    if mode == "round-robin":
+        pairings = list(itertools.combinations(agents, 2))
+    elif mode == "gauntlet":
+        pairings = [(agents[0], other) for other in agents[1:]]
+    else:
+        raise ValueError(f"Unknown tournament mode {mode}.")
+
+    matches = [(pair, size, i) for pair in pairings for size in sizes for i in range(games)]
+    seeds = np.random.SeedSequence(seed).generate_state(len(matches))
+    return [(game, pair if i % 2 == 0 else pair[::-1], width, height, int(seeds[game]))
+            for game, ((pair, (width, height), i)) in enumerate(matches)]
+
+
+def run_tournament(agents, mode="round-robin", games=10, sizes=((7, 6),), workers=1, seed=None, output=None):
+    # Play every game across a pool of processes, appending each result to
+    # the output file as a line of JSON as soon as it finishes
+    results = []
+    out_file = open(output, "a") if output else None
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(play_game, *game) for game in schedule(agents, mode, games, sizes, seed)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if out_file is not None:
+                    out_file.write(json.dumps(result) + "\n")
+                    out_file.flush()
+    finally:
+        if out_file is not None:
+            out_file.close()
+
+    results.sort(key=lambda r: r["game"])
+    return results
+
+
+def read_results(filename):
+    with open(filename) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def elo_ratings(results, prior_draws=PRIOR_DRAWS, iterations=1000):
+    # Bradley-Terry ratings fitted by maximum likelihood, a draw counting as
+    # half a win each, on the Elo scale with an average of 0. Returns the
+    # ratings and the half width of their 95% confidence intervals.
+    names = sorted({player for r in results for player in r["players"]})
+    index = {name: i for i, name in enumerate(names)}
+    n = len(names)
+
+    games = np.zeros((n, n))
+    scores = np.zeros(n)
+    for r in results:
+        a, b = index[r["players"][0]], index[r["players"][1]]
+        games[a, b] += 1
+        games[b, a] += 1
+        scores[a] += r["score"]
+        scores[b] += 1 - r["score"]
+
+    played = games > 0
+    games += prior_draws * played
+    scores += prior_draws * played.sum(axis=1) / 2
+
+    # Minorisation-maximisation updates of the strengths
+    strengths = np.ones(n)
+    for i in range(iterations):
+        totals = (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+        new_strengths = scores / np.maximum(totals, 1e-300)
+        new_strengths /= np.exp(np.mean(np.log(new_strengths)))
+        if np.allclose(new_strengths, strengths, rtol=1e-10):
+            strengths = new_strengths
+            break
+        strengths = new_strengths
+
+    # Standard errors from the inverse of the Fisher information
+    p = strengths[:, None] / (strengths[:, None] + strengths[None, :])
+    information = -games * p * p.T
+    np.fill_diagonal(information, 0)
+    np.fill_diagonal(information, -information.sum(axis=1))
+    errors = np.sqrt(np.maximum(np.diag(np.linalg.pinv(information)), 0))
+
+    ratings = ELO_SCALE * np.log(strengths)
+    return {name: (float(ratings[i]), float(1.96 * ELO_SCALE * errors[i])) for name, i in index.items()}
+
+
+def summarise(results, elapsed=None):
+    # Win/draw/loss, Elo and mean time per move of every agent
+    summary = dict()
+    for r in results:
+        for side in range(2):
+            name = r["players"][side]
+            entry = summary.setdefault(name, {"wins": 0, "draws": 0, "losses": 0, "time": 0.0, "moves": 0})
+            score = r["score"] if side == 0 else 1 - r["score"]
+            entry["wins" if score == 1 else "draws" if score == 0.5 else "losses"] += 1
+            entry["time"] += r["times"][side]
+            entry["moves"] += r["move_counts"][side]
+
+    for name, (rating, interval) in elo_ratings(results).items():
+        entry = summary[name]
+        entry["elo"], entry["elo_interval"] = rating, interval
+        entry["time_per_move"] = entry.pop("time") / max(entry.pop("moves"), 1)
+
+    report = {"games": len(results), "agents": summary}
+    if elapsed:
+        report["games_per_s"] = len(results) / elapsed
+    return report
+
+
+def format_summary(report):
+    lines = [f"{'agent':<24}{'elo':>16}{'win':>6}{'draw':>6}{'loss':>6}{'ms/move':>10}"]
+    for name, entry in sorted(report["agents"].items(), key=lambda item: -item[1]["elo"]):
+        lines.append(f"{name:<24}{entry['elo']:>8.0f} ± {entry['elo_interval']:<5.0f}"
+                     f"{entry['wins']:>6}{entry['draws']:>6}{entry['losses']:>6}"
+                     f"{1000 * entry['time_per_move']:>10.2f}")
+    lines.append(f"{report['games']} games" +
+                 (f", {report['games_per_s']:.1f} games/s" if "games_per_s" in report else ""))
+    return "\n".join(lines)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play agents against each other without a display.")
+    parser.add_argument("agents", nargs="+", help="agents such as random, minimax:4, q:qtable.bin or solver")
+    parser.add_argument("--mode", default="round-robin", choices=["round-robin", "gauntlet"],
+                        help="every pair of agents, or the first agent against each of the others")
+    parser.add_argument("--games", type=int, default=10, help="games per pairing and board size")
+    parser.add_argument("--sizes", nargs="+", default=["7x6"], help="board sizes as WIDTHxHEIGHT")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="file to append each game's result to as a line of JSON")
+    args = parser.parse_args()
+
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes]
+    start_time = time.perf_counter()
+    results = run_tournament(args.agents, args.mode, args.games, sizes, args.workers, args.seed, args.output)
+    print(format_summary(summarise(results, time.perf_counter() - start_time)))
@@ -0,0 +1,76 @@
+# Bound types for stored scores
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+DEFAULT_TABLE_SIZE = 2 ** 20
+
+
+class TranspositionTable:
+    # Fixed size table of search results using a two-tier replacement scheme.
+    # Every bucket has a depth-preferred slot, which is only replaced by a
+    # search of at least the same depth, and an always-replace slot which
+    # holds the most recent entry that didn't make it into the first slot.
+    #
+    # Entries are tuples of (key, depth, score, bound, move).
+    def __init__(self, size=DEFAULT_TABLE_SIZE):
+        # Two entries per bucket
+        self.size = size
+        self._num_buckets = max(1, size // 2)
+        self.clear()
+
+
+    def clear(self):
+        self._deep = [None] * self._num_buckets
+        self._recent = [None] * self._num_buckets
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+
+
+    def probe(self, key):
+        self.probes += 1
+        bucket = hash(key) % self._num_buckets
+
+        entry = self._deep[bucket]
+        if entry is None or entry[0] != key:
+            entry = self._recent[bucket]
+            if entry is None or entry[0] != key:
+                return None
+
+        self.hits += 1
+        return entry
+
+
+    def store(self, key, depth, score, bound, move):
+        self.stores += 1
+        bucket = hash(key) % self._num_buckets
+        entry = (key, depth, score, bound, move)
+
+        deep = self._deep[bucket]
+        if deep is None or deep[0] == key or depth >= deep[1]:
+            if deep is not None and deep[0] != key:
+                self.replacements += 1
+                # Demote the old entry rather than losing it
+                self._recent[bucket] = deep
+            self._deep[bucket] = entry
+        else:
+            if self._recent[bucket] is not None:
+                self.replacements += 1
+            self._recent[bucket] = entry
+
+
+    def __len__(self):
+        return sum(e is not None for e in self._deep) + sum(e is not None for e in self._recent)
+
+
+    def get_stats(self):
+        return {"probes": self.probes,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.probes if self.probes else 0.0,
+                "stores": self.stores,
+                "store_rate": self.stores / self.probes if self.probes else 0.0,
+                "replacements": self.replacements,
+                "entries": len(self),
+                "size": self.size}
@@ -0,0 +1,111 @@
+from Board import *
+from Agent import MinimaxAgent, SearchCancelled
+from AIWorker import AIWorker
+import time
+import unittest
+
+
+class testAIWorker(unittest.TestCase):
+    def setUp(self):
+        self.board = Board(8, 8, PIECE1)
+        for move in [3, 4, 3, 2, 5]:
+            self.board.play(move)
+
+
+    def wait_for_move(self, worker, timeout=10):
+        end_time = time.perf_counter() + timeout
+        while time.perf_counter() < end_time:
+            move = worker.poll()
+            if move is not None:
+                return move
+            time.sleep(0.001)
+        self.fail("No move from the worker")
+
+
+    def test_same_move(self):
+        expected = MinimaxAgent(self.board, depth=4).get_move()
+        worker = AIWorker(MinimaxAgent(Board(8, 8), depth=4, tt_size=1024))
+        move_stack = self.board.get_move_stack()
+
+        worker.request_move(self.board)
+        self.assertTrue(worker.is_thinking())
+        self.assertEqual(self.wait_for_move(worker), expected)
+        self.assertFalse(worker.is_thinking())
+
+        # The search was of a copy of the board
+        self.assertEqual(self.board.get_move_stack(), move_stack)
+
+        worker.new_game()
+        worker.request_move(self.board)
+        self.assertEqual(self.wait_for_move(worker), expected)
+        worker.close()
+
+
+    def test_cancel(self):
+        agent = MinimaxAgent(Board(8, 8), depth=12)
+        worker = AIWorker(agent)
+        worker.request_move(self.board)
+        time.sleep(0.05)
+
+        # The search stops straight away and its move is never returned
+        start_time = time.perf_counter()
+        worker.cancel()
+        worker.close()
+        self.assertLess(time.perf_counter() - start_time, 1)
+        self.assertIsNone(worker.poll())
+        self.assertFalse(worker.is_thinking())
+
+        # The agent's board was put back after the search was cancelled
+        self.assertEqual(agent.board.get_move_stack(), self.board.get_move_stack())
+
+
+    def test_ponder(self):
+        agent = MinimaxAgent(Board(8, 8), depth=3, tt_size=2 ** 16)
+        worker = AIWorker(agent)
+        worker.ponder(self.board)
+        self.assertTrue(worker.is_pondering())
+
+        # Wait for a reply to every move
+        end_time = time.perf_counter() + 10
+        while len(worker._ponder_moves) < 8 and time.perf_counter() < end_time:
+            time.sleep(0.001)
+
+        # The reply is ready as soon as the move is played
+        self.board.play(6)
+        worker.request_move(self.board)
+        self.assertFalse(worker.is_pondering())
+        self.assertEqual(worker.poll(), MinimaxAgent(self.board, depth=3).get_move())
+
+        # Pondering stops straight away when cancelled
+        agent.depth = 12
+        worker.ponder(self.board)
+        time.sleep(0.05)
+        worker.cancel()
+        start_time = time.perf_counter()
+        worker.close()
+        self.assertLess(time.perf_counter() - start_time, 1)
+
+
+    def test_cancelled_search(self):
+        # Cancelling a search running on the same thread, for a fixed
+        # depth, raises once the next position is visited
+        agent = MinimaxAgent(self.board, depth=3, progress=lambda stats: agent.cancel(), progress_interval=10)
+        with self.assertRaises(SearchCancelled):
+            agent.search()
+        self.assertEqual(self.board.get_turn_number(), 5)
+
+
+    def test_cancel_before_search(self):
+        # A cancel arriving between the worker starting a request and the
+        # search starting isn't lost, the agent stays cancelled until cleared
+        agent = MinimaxAgent(self.board, depth=3)
+        agent.cancel()
+        with self.assertRaises(SearchCancelled):
+            agent.search()
+        agent.clear_cancel()
+        self.assertIsNotNone(agent.get_move())
+
+
+
+if __name__ == "__main__":
+    unittest.main()
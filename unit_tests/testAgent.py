@@ -1,12 +1,18 @@
 from Board import *
-from Agent import RandAgent, MinimaxAgent
+from BitBoard import BitBoard
+from Agent import RandAgent, MinimaxAgent, SearchCancelled
+import threading
+import time
 import unittest
 
 
 class testMinimaxAgent(unittest.TestCase):
+    board_class = Board
+    agent_options = {}
+
     def setUp(self, board_size=(8, 8), agent_depth=4):
-        self.board = Board(*board_size, PIECE1)
-        self.agent = MinimaxAgent(self.board, depth=agent_depth)
+        self.board = self.board_class(*board_size, PIECE1)
+        self.agent = MinimaxAgent(self.board, depth=agent_depth, **self.agent_options)
 
     """
     ?
@@ -69,6 +75,132 @@ class testMinimaxAgent(unittest.TestCase):
         self.assertEqual(3, move)
 
 
+    def test_time_limit(self):
+        self.setUp(agent_depth=3)
+        for i in range(3):
+            self.board.play(i)
+            self.board.play(i)
+        move_stack = self.board.get_move_stack()
+
+        result = self.agent.search(time_limit=0.2)
+        self.assertEqual(3, result.move)
+        self.assertGreaterEqual(result.depth, 1)
+
+        # The board is left as it was, even if the search was interrupted
+        self.assertEqual(move_stack, self.board.get_move_stack())
+
+
+    def test_stats(self):
+        for move in [3, 4, 3, 2, 5]:
+            self.board.play(move)
+        self.assertIsNone(self.agent.search().stats)
+
+        progress = []
+        agent = MinimaxAgent(self.board, depth=4, progress=lambda stats: progress.append(stats.nodes),
+                             progress_interval=100, **self.agent_options)
+        result = agent.search()
+        stats = result.stats
+        self.assertIs(stats, agent.stats)
+        self.assertEqual(stats.nodes, agent.nodes)
+        self.assertEqual(progress, list(range(100, agent.nodes + 1, 100)))
+        self.assertLess(stats.leaves, stats.nodes)
+        self.assertGreater(sum(stats.cutoffs), 0)
+        self.assertEqual([d for d, _, _ in stats.depth_times], [4])
+
+        # The principal variation starts with the move chosen and can be played
+        pv = stats.principal_variation
+        self.assertEqual(pv[0], result.move)
+        self.assertLessEqual(len(pv), 4)
+        for move in pv:
+            self.board.play(move)
+
+
+
+class testMinimaxAgentBitBoard(testMinimaxAgent):
+    board_class = BitBoard
+
+
+
+class testMinimaxAgentTranspositionTable(testMinimaxAgent):
+    agent_options = {"tt_size": 1024}
+
+    def test_table_cleared(self):
+        self.agent.get_move()
+        self.assertGreater(len(self.agent.transposition_table), 0)
+
+        self.agent.new_game(Board(8, 8, PIECE1))
+        self.assertEqual(len(self.agent.transposition_table), 0)
+        self.assertEqual(self.agent.transposition_table.get_stats()["probes"], 0)
+
+
+
+class testMinimaxAgentMoveOrdering(testMinimaxAgent):
+    agent_options = {"centre_first": True, "killer_moves": True, "history_heuristic": True}
+
+    # Ordering must not change the score, only the number of nodes searched
+    def test_same_score(self):
+        for move in [3, 4, 3, 2, 5]:
+            self.board.play(move)
+        plain_agent = MinimaxAgent(self.board, depth=4)
+
+        plain = plain_agent.search()
+        ordered = self.agent.search()
+        self.assertEqual(plain.score, ordered.score)
+        self.assertLessEqual(self.agent.nodes, plain_agent.nodes)
+
+
+
+class testMinimaxAgentParallel(unittest.TestCase):
+    def test_matches_serial(self):
+        # The table is given but not used by the parallel search
+        board = Board(7, 6, PIECE1)
+        agent = MinimaxAgent(board, depth=4, workers=2, tt_size=2 ** 16)
+        try:
+            for move in [3, 3, 2, 4, 4]:
+                board.play(move)
+                serial = MinimaxAgent(board, depth=4).search()
+                parallel = agent.search()
+                self.assertEqual(serial.move, parallel.move)
+                self.assertEqual(serial.score, parallel.score)
+            self.assertEqual(len(agent.transposition_table), 0)
+        finally:
+            agent.close()
+
+
+    def test_cancel(self):
+        # Cancelling stops the worker processes rather than waiting for them
+        board = Board(7, 6, PIECE1)
+        agent = MinimaxAgent(board, depth=12, workers=2)
+        try:
+            agent.search(time_limit=0.01)
+            timer = threading.Timer(0.2, agent.cancel)
+            timer.start()
+            start_time = time.perf_counter()
+            with self.assertRaises(SearchCancelled):
+                agent.search()
+            self.assertLess(time.perf_counter() - start_time, 2)
+            timer.join()
+        finally:
+            agent.close()
+
+
+    def test_matches_serial_ordered(self):
+        # o can win in column 0 or 4, and the centre first order decides which
+        board = Board(7, 6, PIECE1)
+        for move in [1, 1, 2, 2, 3, 5]:
+            board.play(move)
+        options = {"centre_first": True, "killer_moves": True, "history_heuristic": True}
+        agent = MinimaxAgent(board, depth=4, workers=2, **options)
+        try:
+            serial = MinimaxAgent(board, depth=4, **options).search()
+            parallel = agent.search()
+            self.assertEqual(serial.move, 4)
+            self.assertEqual(serial.move, parallel.move)
+            self.assertEqual(serial.score, parallel.score)
+        finally:
+            agent.close()
+
+
 
 if __name__ == "__main__":
     unittest.main()
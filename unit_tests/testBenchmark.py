@@ -0,0 +1,45 @@
+from Board import *
+from BitBoard import BitBoard
+from Benchmark import perft, compare_results, run_benchmarks
+import os
+import subprocess
+import sys
+import unittest
+
+
+class testBenchmark(unittest.TestCase):
+    def test_perft(self):
+        # No game can end in fewer than 7 moves
+        for board_class in [Board, BitBoard]:
+            self.assertEqual([perft(board_class(7, 6), depth) for depth in range(5)], [1, 7, 49, 343, 2401])
+
+        # Games on a 4x1 board are drawn after the columns are filled in any order
+        self.assertEqual(perft(Board(4, 1), 6), 4 * 3 * 2)
+
+
+    def test_compare(self):
+        baseline = {"results": {"a/play_per_s": 100.0, "a/move_s": 1.0, "a/leaf_count": 49, "a/nodes": 10}}
+        results = {"results": {"a/play_per_s": 95.0, "a/move_s": 1.5, "a/leaf_count": 48, "a/nodes": 20}}
+
+        regressions = compare_results(results, baseline, threshold=0.1)
+        self.assertEqual([r[0] for r in regressions], ["a/leaf_count", "a/move_s"])
+        self.assertEqual(compare_results(baseline, baseline), [])
+
+
+    def test_run(self):
+        results = run_benchmarks(["board", "perft"], quick=True)["results"]
+        self.assertEqual(results["perft/BitBoard/7x6/depth_4/leaf_count"], 2401)
+        self.assertGreater(results["board/Board/7x6/play_undo_per_s"], 0)
+
+
+    def test_startup(self):
+        # The game and agents import without a display or any of the heavy modules
+        code = "import Game, sys; print([m for m in ['pygame', 'scipy', 'concurrent.futures'] if m in sys.modules])"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.stdout.strip(), "[]")
+
+
+
+if __name__ == "__main__":
+    unittest.main()
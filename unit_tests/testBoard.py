@@ -1,10 +1,13 @@
 from Board import *
+from BitBoard import BitBoard
 import unittest
 
 
 class GameTest(unittest.TestCase):
+    board_class = Board
+
     def setUp(self):
-        self.board = Board(8, 8, PIECE1)
+        self.board = self.board_class(8, 8, PIECE1)
 
     """
     o
@@ -170,7 +173,83 @@ class GameTest(unittest.TestCase):
         self.assertEqual(self.board.get_winner(), NO_PIECE)
         self.assertEqual(self.board.get_turn(), PIECE2)
         self.assertEqual(self.board.get_turn_number(), 63)
-        
+
+
+    """
+    o
+    o x
+    o x   x
+    """
+    def test_threats(self):
+        for move in [0, 1, 0, 1, 0, 3]:
+            self.board.play(move)
+
+        self.assertEqual(self.board.winning_moves(PIECE1), [0])
+        self.assertEqual(self.board.winning_moves(PIECE2), [])
+        self.assertTrue(self.board.is_winning_move(0))
+        self.assertFalse(self.board.is_winning_move(1))
+        self.assertEqual(self.board.must_block_moves(), [])
+
+        # Not winning lets x block
+        self.board.play(2)
+        self.assertEqual(self.board.must_block_moves(), [0])
+        self.assertTrue(self.board.is_losing_move(1))
+        self.assertFalse(self.board.is_losing_move(0))
+
+        # Nothing was played to find out
+        self.assertEqual(self.board.get_move_stack(), [0, 1, 0, 1, 0, 3, 2])
+        self.assertEqual(self.board.get_turn(), PIECE2)
+
+
+    """
+      x x x
+    ? o o x ? o o
+    """
+    def test_losing_move_below(self):
+        # Playing under either end of the line gives x the cell above it
+        for move in [1, 3, 2, 1, 5, 2, 6, 3]:
+            self.board.play(move)
+        self.assertEqual(self.board.must_block_moves(), [])
+        self.assertTrue(self.board.is_losing_move(0))
+        self.assertTrue(self.board.is_losing_move(4))
+        self.assertFalse(self.board.is_losing_move(5))
+
+
+    def test_position_key(self):
+        empty_key = self.board.position_key()
+        self.board.play(0)
+        self.board.play(1)
+        key = self.board.position_key()
+
+        # Undo restores the key, and the same moves by the other players
+        # are a different position
+        self.board.undo()
+        self.board.undo()
+        self.assertEqual(self.board.position_key(), empty_key)
+        self.board.play(1)
+        self.board.play(0)
+        self.assertNotEqual(self.board.position_key(), key)
+        self.board.undo()
+        self.board.undo()
+        self.board.play(0)
+        self.board.play(1)
+        self.assertEqual(self.board.position_key(), key)
+
+        # Transpositions share a key
+        self.board.play(2)
+        other = self.board_class(8, 8, PIECE1)
+        for move in [2, 1, 0]:
+            other.play(move)
+        self.assertEqual(other.position_key(), self.board.position_key())
+        self.board.undo()
+
+        # The same counters with the colours swapped only share a relative key
+        swapped = self.board_class(8, 8, PIECE2)
+        swapped.play(0)
+        swapped.play(1)
+        self.assertNotEqual(swapped.position_key(), key)
+        self.assertEqual(swapped.position_key(relative=True), self.board.position_key(relative=True))
+
     
     # Generic test for a winner
     def __test_winner(self, piece):
@@ -180,5 +259,33 @@ class GameTest(unittest.TestCase):
 
 
 
+# Run the same tests against the bitboard engine
+class BitBoardGameTest(GameTest):
+    board_class = BitBoard
+
+    # Play random games on both engines and compare every position
+    def test_matches_board(self):
+        rng = np.random.RandomState(0)
+        for game in range(20):
+            board = Board(7, 6, PIECE1)
+            bitboard = BitBoard(7, 6, PIECE1)
+            while len(board.get_valid_moves()) > 0:
+                self.assertEqual(board.get_valid_moves(), bitboard.get_valid_moves())
+                move = int(rng.choice(board.get_valid_moves()))
+                board.play(move)
+                bitboard.play(move)
+                self.assertTrue(np.array_equal(board.get_board(), bitboard.get_board()))
+                self.assertEqual(board.get_winner(), bitboard.get_winner())
+                self.assertEqual(board.get_turn(), bitboard.get_turn())
+                self.assertEqual(board.position_key(), bitboard.position_key())
+
+            self.assertEqual(board.get_move_stack(), bitboard.get_move_stack())
+            board.undo()
+            bitboard.undo()
+            self.assertTrue(np.array_equal(board.get_board(), bitboard.get_board()))
+            self.assertEqual(board.get_turn(), bitboard.get_turn())
+
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+from Board import *
+from BoardBatch import BoardBatch
+import numpy as np
+import unittest
+
+
+class testBoardBatch(unittest.TestCase):
+    def setUp(self):
+        self.batch = BoardBatch(200, 7, 6, PIECE1)
+
+    # Random games must end the same way when replayed on a Board
+    def test_matches_board(self):
+        winners = self.batch.play_out(rng=np.random.RandomState(0))
+        moves = self.batch.get_move_stacks()
+
+        for game in range(len(winners)):
+            board = Board(7, 6, PIECE1)
+            for move in moves[game]:
+                if move == -1:
+                    break
+                self.assertEqual(board.get_winner(), NO_PIECE)
+                board.play(int(move))
+
+            self.assertEqual(board.get_winner(), winners[game])
+            self.assertTrue(np.array_equal(board.get_board(), self.batch.get_boards()[game]))
+            self.assertEqual(board.get_turn_number(), self.batch.get_turn_numbers()[game])
+
+    """
+    o
+    o x
+    o x
+    o x
+    """
+    def test_finished(self):
+        # The second half of the games alternate between columns 2 and 3 instead
+        columns = np.zeros(200, dtype=int)
+        for i in range(4):
+            columns[100:] = 2 + i % 2
+            finished = self.batch.play(columns)
+            if i < 3:
+                self.batch.play(np.ones(200, dtype=int))
+
+        self.assertTrue(np.all(finished[:100]))
+        self.assertFalse(np.any(finished[100:]))
+        self.assertTrue(np.all(self.batch.get_winners()[:100] == PIECE1))
+        self.assertTrue(np.all(self.batch.get_turns()[:100] == NO_PIECE))
+        self.assertFalse(np.any(self.batch.get_valid_moves()[:100]))
+
+        # Finished games ignore any further moves
+        self.batch.play(np.full(200, 3))
+        self.assertEqual(self.batch.get_boards()[0, -1, 3], NO_PIECE)
+        self.assertEqual(self.batch.get_boards()[100, -3, 3], PIECE2)
+
+
+    def test_full_column(self):
+        for i in range(6):
+            self.batch.play(np.zeros(200, dtype=int))
+        with self.assertRaises(Warning):
+            self.batch.play(np.zeros(200, dtype=int))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+from Board import *
+from Evaluation import WindowEvaluator, get_windows
+from Agent import MinimaxAgent
+import unittest
+
+
+class testWindowEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.board = Board(7, 6, PIECE1)
+        self.evaluator = WindowEvaluator(7, 6)
+
+
+    def test_window_count(self):
+        # 24 horizontal, 21 vertical and 12 of each diagonal on a 7x6 board
+        self.assertEqual(len(get_windows(7, 6)), 69)
+
+
+    def test_symmetric(self):
+        self.board.play(3)
+        self.board.play(0)
+        score = self.evaluator(self.board, PIECE1)
+        self.assertGreater(score, 0)
+        self.assertEqual(score, -self.evaluator(self.board, PIECE2))
+
+    """
+    x x
+    o o o
+    """
+    def test_open_three(self):
+        for i in range(2):
+            self.board.play(i)
+            self.board.play(i)
+        self.board.play(2)
+
+        score = self.evaluator(self.board, PIECE1)
+        self.assertGreater(score, 0)
+        self.assertLess(score, 1)
+
+
+    def test_agent_blocks(self):
+        for i in range(2):
+            self.board.play(i)
+            self.board.play(i)
+        self.board.play(2)
+
+        agent = MinimaxAgent(self.board, depth=1, evaluator=self.evaluator)
+        self.assertEqual(3, agent.get_move())
+
+
+
+if __name__ == "__main__":
+    unittest.main()
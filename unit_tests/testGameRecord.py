@@ -0,0 +1,72 @@
+from Board import *
+from BitBoard import BitBoard
+from GameRecord import GameWriter, GameRecord, read_games, replay
+from QLearning import QLearner
+import os
+import tempfile
+import unittest
+
+
+class testGameRecord(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "games.bin")
+
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def test_round_trip(self):
+        board = Board(7, 6, PIECE2)
+        for move in [3, 3, 4, 4, 5, 5, 6]:
+            board.play(move)
+
+        with GameWriter(self.filename, buffer_size=16) as writer:
+            writer.write_board(board, PIECE2)
+            writer.write(16, 4, PIECE1, NO_PIECE, [15, 0, 15])
+            writer.write(4, 4, PIECE1, NO_PIECE, [])
+
+        # Appending keeps the games already written
+        with GameWriter(self.filename) as writer:
+            writer.write(4, 4, PIECE1, STALEMATE, [1, 2])
+
+        games = list(read_games(self.filename))
+        self.assertEqual(games, [GameRecord(7, 6, PIECE2, PIECE2, [3, 3, 4, 4, 5, 5, 6]),
+                                 GameRecord(16, 4, PIECE1, NO_PIECE, [15, 0, 15]),
+                                 GameRecord(4, 4, PIECE1, NO_PIECE, []),
+                                 GameRecord(4, 4, PIECE1, STALEMATE, [1, 2])])
+
+        board = replay(games[0], BitBoard)
+        self.assertEqual(board.get_winner(), PIECE2)
+
+        with GameWriter(self.filename) as writer, self.assertRaises(ValueError):
+            writer.write(17, 4, PIECE1, NO_PIECE, [])
+
+
+    def test_partial_record(self):
+        with GameWriter(self.filename) as writer:
+            writer.write(7, 6, PIECE1, NO_PIECE, [3, 3, 3])
+            writer.write(7, 6, PIECE1, NO_PIECE, [1, 2, 3, 4, 5])
+
+        # A record cut short by a crash is skipped
+        with open(self.filename, "r+b") as file:
+            file.truncate(os.path.getsize(self.filename) - 1)
+        self.assertEqual([game.moves for game in read_games(self.filename)], [[3, 3, 3]])
+
+
+    def test_self_play(self):
+        learner = QLearner(board_width=5, board_height=4, training_rounds=0)
+        with GameWriter(self.filename) as writer:
+            learner.train(3, game_writer=writer)
+            learner.train(4, workers=2, seed=0, sync_every=2, game_writer=writer)
+
+        games = list(read_games(self.filename))
+        self.assertEqual(len(games), 7)
+        for game in games:
+            self.assertEqual(replay(game).get_winner(), game.winner)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+from Board import *
+from Agent import MinimaxAgent
+from Evaluation import WindowEvaluator
+from OpeningBook import OpeningBook, build_opening_book
+import os
+import tempfile
+import unittest
+
+
+class testOpeningBook(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.book = build_opening_book(5, 4, PIECE1, plies=3, depth=3)
+
+
+    def test_positions(self):
+        # 1 + 3 + 13 positions after removing mirror images
+        self.assertEqual(len(self.book), 17)
+
+        board = Board(5, 4, PIECE1)
+        for move in [0, 4, 1]:
+            board.play(move)
+        self.assertIsNone(self.book.lookup(board))
+        self.assertIsNone(self.book.lookup(Board(6, 4, PIECE1)))
+
+
+    def test_matches_search(self):
+        for moves in [[], [1], [0, 3], [4, 1]]:
+            board = Board(5, 4, PIECE1)
+            for move in moves:
+                board.play(move)
+            agent = MinimaxAgent(board, 3, tt_size=2 ** 18,
+                                 centre_first=True, killer_moves=True, history_heuristic=True,
+                                 evaluator=WindowEvaluator(5, 4))
+            result = agent.search()
+            move, score = self.book.lookup(board)
+            self.assertEqual(move, result.move)
+            self.assertAlmostEqual(score, result.score, places=6)
+
+
+    def test_agent(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "book.bin")
+            self.book.save(filename)
+            book = OpeningBook.load(filename)
+
+        board = Board(5, 4, PIECE1)
+        board.play(3)
+        agent = MinimaxAgent(board, depth=5, opening_book=book)
+        result = agent.search()
+
+        self.assertEqual(result.move, self.book.lookup(board)[0])
+        self.assertEqual(result.depth, 3)
+        self.assertEqual(agent.nodes, 0)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
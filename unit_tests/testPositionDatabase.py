@@ -0,0 +1,68 @@
+from Board import *
+from BitBoard import BitBoard
+from PositionDatabase import PositionDatabase, build_position_database, UNKNOWN
+from Solver import Solver, SolverAgent
+import numpy as np
+import os
+import tempfile
+import unittest
+
+
+class testPositionDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.database = build_position_database(4, 4)
+
+
+    def test_matches_solver(self):
+        solver = Solver(4, 4)
+        rng = np.random.RandomState(0)
+        for game in range(50):
+            board = Board(4, 4, PIECE2 if game % 2 else PIECE1)
+            for i in range(rng.randint(0, 14)):
+                board.play(int(rng.choice(board.get_valid_moves())))
+                if board.get_winner() != NO_PIECE:
+                    break
+            if board.get_winner() != NO_PIECE:
+                continue
+
+            self.assertEqual(self.database.lookup(board), solver.solve(board))
+            self.assertEqual(self.database.score_columns(board), solver.score_columns(board))
+
+
+    def test_index(self):
+        # Both players and board classes give the same index
+        boards = [Board(4, 4, PIECE1), Board(4, 4, PIECE2), BitBoard(4, 4, PIECE1)]
+        for board in boards:
+            for move in [1, 2, 2, 0, 3]:
+                board.play(move)
+        self.assertEqual(len({self.database.index(board) for board in boards}), 1)
+        self.assertEqual(self.database.index(Board(4, 4)), 0)
+
+        # 4x4 is a draw, and only positions reachable in a game have a value
+        self.assertEqual(self.database.lookup(Board(4, 4)), 0)
+        self.assertEqual(np.count_nonzero(self.database._values != UNKNOWN), 134289)
+
+        with self.assertRaises(ValueError):
+            PositionDatabase(6, 7)
+
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "positions.bin")
+            self.database.save(filename)
+            for mmap in [True, False]:
+                database = PositionDatabase.load(filename, mmap)
+                board = Board(4, 4)
+                for move in [0, 1, 0, 1, 0]:
+                    board.play(move)
+
+                # The only move is to block
+                self.assertEqual(database.score_columns(board), self.database.score_columns(board))
+                self.assertEqual(SolverAgent(board, database).get_move(), 0)
+                del database
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+from Board import *
+from QLearning import QLearner, QAgent
+from GameRecord import GameRecord, GameWriter
+import os
+import tempfile
+import unittest
+
+
+class testQLearner(unittest.TestCase):
+    def setUp(self):
+        self.qlearner = QLearner(board_width=5, board_height=4, training_rounds=0)
+
+
+    def test_train(self):
+        self.qlearner.train(5)
+        self.assertGreater(len(self.qlearner.Q), 0)
+
+
+    def test_save_load(self):
+        self.qlearner.train(5)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "q.bin")
+            self.qlearner.save(filename)
+
+            for mmap in [True, False]:
+                other = QLearner(board_width=8, board_height=8, training_rounds=0, learning_rate=0.1)
+                other.load(filename, mmap)
+                self.assertEqual(len(self.qlearner.Q), len(other.Q))
+                self.assertEqual((other.board_width, other.board_height), (5, 4))
+                self.assertEqual(other.learning_rate, self.qlearner.learning_rate)
+
+                keys = self.qlearner.Q.get_keys()
+                for row in range(len(keys)):
+                    key = self.qlearner.Q.words_key(keys[row])
+                    self.assertTrue(np.array_equal(self.qlearner.Q.get_values()[row], other.Q.get(key), equal_nan=True))
+            del other
+
+
+    def test_save_over_loaded(self):
+        # Load, train and save back to the same file, as QLearning.py does
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "q.bin")
+            self.qlearner.train(5)
+            self.qlearner.save(filename)
+
+            other = QLearner(board_width=5, board_height=4, training_rounds=0)
+            other.load(filename)
+            other.train(5)
+            other.save(filename)
+            self.assertNotIsInstance(other.Q._base_keys, np.memmap)
+            self.assertNotIsInstance(other.Q._base_values, np.memmap)
+
+            final = QLearner(board_width=5, board_height=4, training_rounds=0)
+            final.load(filename, mmap=False)
+            self.assertEqual(len(other.Q), len(final.Q))
+            del other, final
+
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "q.bin")
+            self.qlearner.train(5)
+            self.qlearner.save(filename)
+            size = os.path.getsize(filename)
+
+            # Keep training from the memory mapped file and checkpoint
+            other = QLearner(board_width=5, board_height=4, training_rounds=0)
+            other.load(filename)
+            other.train(5)
+            other.checkpoint(filename)
+            self.assertGreater(os.path.getsize(filename), size)
+
+            final = QLearner(board_width=5, board_height=4, training_rounds=0)
+            final.load(filename)
+            self.assertEqual(len(other.Q), len(final.Q))
+
+            # Saving again compacts the file into one segment
+            final.save(filename)
+            compact = QLearner(board_width=5, board_height=4, training_rounds=0)
+            compact.load(filename)
+            self.assertEqual(len(other.Q), len(compact.Q))
+            self.assertEqual(len(compact.Q.get_keys()), 0)
+            del other, final, compact
+
+
+    def test_train_offline(self):
+        games = [[2, 2, 1, 3, 0, 4, 3], [0, 1, 2, 3, 4, 0, 1, 2, 3], [2, 2, 1, 3, 0, 4, 3]]
+
+        # Learning from each game on its own matches learning as it's played
+        for moves in games:
+            board = Board(5, 4, PIECE1)
+            for move in moves:
+                self.qlearner.update_Q(board, move)
+                board.play(move)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "games.bin")
+            with GameWriter(filename) as writer:
+                for moves in games:
+                    writer.write(5, 4, PIECE1, NO_PIECE, moves)
+
+            other = QLearner(board_width=5, board_height=4, training_rounds=0)
+            other.train_offline(filename, batch_size=1)
+
+        self.assertEqual(len(other.Q), len(self.qlearner.Q))
+        keys = self.qlearner.Q.get_keys()
+        for row in range(len(keys)):
+            key = self.qlearner.Q.words_key(keys[row])
+            self.assertTrue(np.allclose(self.qlearner.Q.get(key), other.Q.get(key), equal_nan=True))
+
+        # The same game twice in one batch is two updates towards the same target
+        batched = QLearner(board_width=5, board_height=4, training_rounds=0)
+        records = [GameRecord(5, 4, PIECE1, NO_PIECE, moves) for moves in games]
+        batched.train_offline(records, batch_size=3)
+        state, _ = batched.get_state(Board(5, 4, PIECE1))
+        self.assertAlmostEqual(batched.Q.get(state)[2], -1 + (1 - 0.7) ** 2 * (0 + 1))
+
+        batched.train_offline(records, passes=2, batch_size=2)
+        self.assertEqual(len(batched.Q), len(self.qlearner.Q))
+
+        with self.assertRaises(ValueError):
+            batched.train_offline(iter(records), passes=2)
+        with self.assertRaises(ValueError):
+            batched.train_offline([GameRecord(7, 6, PIECE1, NO_PIECE, [])])
+
+
+    def test_parallel_reproducible(self):
+        self.qlearner.train(8, workers=2, seed=1, sync_every=4)
+
+        other = QLearner(board_width=5, board_height=4, training_rounds=0)
+        other.train(8, workers=2, seed=1, sync_every=4)
+
+        self.assertGreater(len(self.qlearner.Q), 0)
+        self.assertTrue(np.array_equal(self.qlearner.Q.get_keys(), other.Q.get_keys()))
+        self.assertTrue(np.array_equal(self.qlearner.Q.get_values(), other.Q.get_values(), equal_nan=True))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+from Board import *
+from BitBoard import BitBoard
+from QTable import QTable, get_state_key
+import numpy as np
+import unittest
+
+
+class testQTable(unittest.TestCase):
+    def setUp(self):
+        self.table = QTable(8, 8)
+
+
+    def test_mirror(self):
+        board = Board(8, 8, PIECE1)
+        mirror = Board(8, 8, PIECE1)
+        for move in [0, 1, 1, 5]:
+            board.play(move)
+            mirror.play(7 - move)
+
+        key, mirrored = get_state_key(board)
+        mirror_key, mirror_mirrored = get_state_key(mirror)
+        self.assertEqual(key, mirror_key)
+        self.assertNotEqual(mirrored, mirror_mirrored)
+
+
+    def test_relative(self):
+        # States are relative to the player to move, so swapping the
+        # colours gives the same state
+        board = Board(8, 8, PIECE1)
+        other = Board(8, 8, PIECE2)
+        for move in [0, 3, 3]:
+            board.play(move)
+            other.play(move)
+        self.assertEqual(get_state_key(board), get_state_key(other))
+
+        board.play(4)
+        self.assertNotEqual(get_state_key(board)[0], get_state_key(other)[0])
+
+
+    def test_bitboard(self):
+        # BitBoard's keys come from its bitmasks, and match Board's
+        rng = np.random.RandomState(0)
+        for game in range(10):
+            board, bitboard = Board(7, 6, PIECE1), BitBoard(7, 6, PIECE1)
+            while board.get_winner() == NO_PIECE:
+                move = int(rng.choice(board.get_valid_moves()))
+                board.play(move)
+                bitboard.play(move)
+                self.assertEqual(get_state_key(board), get_state_key(bitboard))
+
+
+    def test_insert_lookup(self):
+        # Keys wider than one 64 bit word on an 8x8 board
+        keys = [int(k) << 40 | i for i, k in enumerate(np.random.RandomState(0).randint(1, 2 ** 31, 1000))]
+        rows = [self.table.insert(key) for key in keys]
+
+        self.assertEqual(len(self.table), len(keys))
+        self.assertEqual(rows, list(range(len(keys))))
+        self.assertEqual([self.table.lookup(key) for key in keys], rows)
+        self.assertEqual(self.table.insert(keys[10]), 10)
+        self.assertEqual(self.table.lookup(12345), -1)
+        self.assertEqual([self.table.words_key(words) for words in self.table.get_keys()], keys)
+
+        words = np.array([self.table.key_words(key) for key in keys + [12345]], dtype=np.uint64)
+        self.assertEqual(self.table.lookup_many(words).tolist(), rows + [-1])
+        self.assertTrue(np.all(np.isnan(self.table.get_values())))
+
+        self.table.set(keys[1], 2, 0.5)
+        values = self.table.get_many([keys[1], 12345])
+        self.assertEqual(values.shape, (2, 8))
+        self.assertEqual(values[0, 2], 0.5)
+        self.assertTrue(np.all(np.isnan(values[1])))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
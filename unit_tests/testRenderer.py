@@ -0,0 +1,57 @@
+from Board import *
+from Renderer import BoardRenderer
+import pygame
+import unittest
+
+WHITE, BLACK, RED, BLUE = (255, 255, 255), (0, 0, 0), (255, 0, 0), (0, 0, 255)
+GOLD, GREY = (255, 255, 0), (127, 127, 127)
+
+
+class testBoardRenderer(unittest.TestCase):
+    def setUp(self):
+        self.board = Board(4, 4, PIECE1)
+        self.surface = pygame.Surface((100, 100))
+        self.renderer = BoardRenderer(4, 4, (10, 10, 80, 80), BLACK, WHITE, BLUE, RED, GOLD, GREY)
+
+
+    def colour_at(self, row, column):
+        x, y = 10 + 20 * column + 10, 10 + 20 * row + 10
+        return tuple(self.surface.get_at((x, y)))[:3]
+
+
+    def test_dirty_rects(self):
+        # Everything is drawn the first time, then nothing until something changes
+        self.assertEqual(self.renderer.draw(self.surface, self.board), [pygame.Rect(10, 10, 80, 80)])
+        self.assertEqual(self.renderer.draw(self.surface, self.board), [])
+        self.assertEqual(self.colour_at(3, 1), WHITE)
+
+        self.board.play(1)
+        self.assertEqual(self.renderer.draw(self.surface, self.board), [pygame.Rect(30, 70, 20, 20)])
+        self.assertEqual(self.colour_at(3, 1), BLUE)
+
+        # Moving the highlight redraws the column it left
+        self.assertEqual(self.renderer.draw(self.surface, self.board, 2), [pygame.Rect(50, 10, 20, 80)])
+        self.assertEqual(self.renderer.draw(self.surface, self.board, 3),
+                         [pygame.Rect(50, 10, 20, 80), pygame.Rect(70, 10, 20, 80)])
+
+        self.board.undo()
+        self.renderer.draw(self.surface, self.board, 3)
+        self.assertEqual(self.colour_at(3, 1), WHITE)
+
+
+    def test_winner(self):
+        self.renderer.draw(self.surface, self.board)
+        for i in range(3):
+            self.board.play(0)
+            self.board.play(1)
+        self.board.play(0)
+
+        # The whole board is redrawn with an outline
+        self.assertEqual(self.renderer.draw(self.surface, self.board), [pygame.Rect(10, 10, 80, 80)])
+        self.assertEqual(tuple(self.surface.get_at((10, 50)))[:3], BLUE)
+        self.assertEqual(self.colour_at(0, 0), BLUE)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
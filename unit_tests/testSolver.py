@@ -0,0 +1,82 @@
+from Board import *
+from Agent import MinimaxAgent
+from Solver import Solver, SolverAgent, WIN, DRAW, LOSS
+import numpy as np
+import unittest
+
+
+class testSolver(unittest.TestCase):
+    def setUp(self):
+        self.board = Board(4, 4, PIECE1)
+        self.solver = Solver(4, 4)
+
+
+    # Plain minimax over the whole game tree, using the solver's scores
+    def brute_force(self, board):
+        best = None
+        for move in board.get_valid_moves():
+            turn, moves = board.get_turn(), board.get_turn_number()
+            board.play(move)
+            if board.get_winner() == turn:
+                score = (16 + 1 - moves) // 2
+            elif board.get_winner() == STALEMATE:
+                score = 0
+            else:
+                score = -self.brute_force(board)
+            board.undo()
+            if best is None or score > best:
+                best = score
+        return best
+
+
+    def test_matches_brute_force(self):
+        rng = np.random.RandomState(0)
+        for game in range(10):
+            self.setUp()
+            for i in range(rng.randint(7, 11)):
+                self.board.play(int(rng.choice(self.board.get_valid_moves())))
+                if self.board.get_winner() != NO_PIECE:
+                    break
+            if self.board.get_winner() != NO_PIECE:
+                continue
+
+            score = self.brute_force(self.board)
+            self.assertEqual(self.solver.solve(self.board), score)
+            self.assertEqual(max(s for s in self.solver.score_columns(self.board) if s is not None), score)
+
+    """
+    o x
+    o x
+    o x
+    """
+    def test_describe(self):
+        for i in range(3):
+            self.board.play(0)
+            self.board.play(1)
+
+        scores = self.solver.score_columns(self.board)
+        self.assertEqual(self.solver.describe(self.board, scores[0]), (WIN, 1))
+        self.assertEqual(self.solver.describe(self.board, scores[2]), (LOSS, 2))
+
+        # 4x4 is a draw with perfect play
+        self.assertEqual(self.solver.describe(Board(4, 4), Solver(4, 4).solve(Board(4, 4))), (DRAW, 16))
+
+
+    # Use the solver as an oracle for the minimax agent
+    def test_minimax_finds_wins(self):
+        board = Board(6, 6, PIECE1)
+        solver = Solver(6, 6)
+        for move in [5, 3, 5, 1, 2, 5, 2, 5, 5, 4, 1, 1, 5, 0]:
+            board.play(move)
+
+        # A win in three moves
+        scores = solver.score_columns(board)
+        self.assertEqual(solver.describe(board, max(s for s in scores if s is not None)), (WIN, 3))
+        move = MinimaxAgent(board, depth=4).get_move()
+        self.assertEqual(scores[move], max(s for s in scores if s is not None))
+        self.assertEqual(SolverAgent(board, solver).get_move(), 3)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+from Board import *
+from BitBoard import BitBoard
+from QLearning import QLearner
+import Tournament
+from Tournament import make_agent, schedule, play_game, run_tournament, read_results, elo_ratings, summarise
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+class testTournament(unittest.TestCase):
+    def test_schedule(self):
+        games = schedule(["a", "b", "c"], "round-robin", games=2, sizes=[(7, 6), (5, 4)], seed=0)
+        self.assertEqual(len(games), 3 * 2 * 2)
+        self.assertEqual([g[1] for g in games[:2]], [("a", "b"), ("b", "a")])
+        self.assertEqual(games, schedule(["a", "b", "c"], "round-robin", games=2, sizes=[(7, 6), (5, 4)], seed=0))
+
+        games = schedule(["a", "b", "c"], "gauntlet", games=1)
+        self.assertEqual([g[1] for g in games], [("a", "b"), ("a", "c")])
+
+
+    def test_play_game(self):
+        result = play_game(0, ("minimax:3", "random"), 5, 4, seed=1)
+        self.assertEqual(sum(result["move_counts"]), len(result["moves"]))
+        self.assertIn(result["score"], [0, 0.5, 1])
+        self.assertEqual(play_game(0, ("minimax:3", "random"), 5, 4, seed=1)["moves"], result["moves"])
+
+
+    def test_elo(self):
+        results = [{"players": ["a", "b"], "score": s} for s in [1, 0, 0.5, 0.5]]
+        ratings = elo_ratings(results)
+        self.assertAlmostEqual(ratings["a"][0], 0)
+        self.assertAlmostEqual(ratings["a"][1], ratings["b"][1])
+
+        # An agent which won every game still has a finite rating
+        results = [{"players": ["a", "b"], "score": 1}] * 10 + [{"players": ["b", "c"], "score": 0.5}] * 10
+        ratings = elo_ratings(results)
+        self.assertGreater(ratings["a"][0], ratings["b"][0])
+        self.assertAlmostEqual(ratings["b"][0], ratings["c"][0], places=3)
+        self.assertAlmostEqual(sum(r for r, _ in ratings.values()), 0)
+
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "results.jsonl")
+            results = run_tournament(["random", "minimax:2"], games=4, sizes=[(5, 4)], seed=0, output=filename)
+            self.assertEqual(read_results(filename), results)
+
+        report = summarise(results, elapsed=1.0)
+        self.assertEqual(report["games"], 4)
+        self.assertEqual(report["games_per_s"], 4)
+        random, minimax = report["agents"]["random"], report["agents"]["minimax:2"]
+        self.assertEqual(random["wins"] + random["draws"] + random["losses"], 4)
+        self.assertEqual(random["wins"], minimax["losses"])
+        self.assertGreater(minimax["elo"], random["elo"])
+
+
+    def test_q_board_size(self):
+        # A Q table only plays on the board size it was trained for
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "q.bin")
+            learner = QLearner(board_width=5, board_height=4, training_rounds=0)
+            learner.train(2)
+            learner.save(filename)
+
+            make_agent(f"q:{filename}", BitBoard(5, 4))
+            with self.assertRaises(ValueError):
+                make_agent(f"q:{filename}", BitBoard(7, 6))
+            Tournament._learners.clear()
+
+
+    def test_no_pygame(self):
+        code = "import Tournament, sys; print('pygame' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.stdout.strip(), "False")
+
+
+
+if __name__ == "__main__":
+    unittest.main()